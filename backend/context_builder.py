@@ -0,0 +1,117 @@
+"""
+Context Builder
+Token-budgeted conversation context for report and extraction prompts
+"""
+
+import re
+
+# Words and individual punctuation marks; roughly how SentencePiece-style tokenizers split English text
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"[.!?](?:\s|$)")
+
+# Long words split into several sub-word tokens
+_CHARS_PER_SUBWORD = 6
+# Real tokenizers spend a token on each newline between context lines
+_SEPARATOR_TOKENS = 1
+_ELLIPSIS = "..."
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the model token count of a piece of text without a tokenizer round trip"""
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // _CHARS_PER_SUBWORD for piece in _TOKEN_RE.findall(text))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to at most max_tokens, preferring a sentence boundary over a mid-sentence cut.
+    A mid-sentence cut ends on a word boundary (or hard-cuts a text with no spaces) and the
+    trailing "..." counts against the budget.
+    """
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    ellipsis_tokens = estimate_tokens(_ELLIPSIS)
+    ellipsis = _ELLIPSIS if max_tokens > ellipsis_tokens else ""
+    budget = max_tokens - (ellipsis_tokens if ellipsis else 0)
+
+    # Binary search the longest prefix that fits, then back off to the last sentence end
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = text[:low]
+
+    sentence_ends = [match.end() for match in _SENTENCE_END_RE.finditer(prefix)]
+    if sentence_ends and sentence_ends[-1] > len(prefix) // 2:
+        return prefix[:sentence_ends[-1]].rstrip()
+
+    # No usable sentence boundary: fall back to the last whole word, or a hard cut if there is none
+    if low < len(text) and not text[low].isspace() and not prefix[-1:].isspace():
+        cut = prefix.rstrip().rfind(' ')
+        if cut > 0:
+            prefix = prefix[:cut]
+    prefix = prefix.rstrip()
+    return prefix + ellipsis if prefix else ""
+
+def _role_and_content(msg):
+    if isinstance(msg, dict):
+        return ("User" if msg.get('role') == 'user' else "Assistant"), msg.get('content', '')
+    if hasattr(msg, 'content'):
+        return ("User" if type(msg).__name__ == 'HumanMessage' else "Assistant"), msg.content
+    return "Assistant", str(msg)
+
+def build_context(messages, max_tokens, summary=None, summary_max_tokens=None):
+    """
+    Fill a token budget with the most recent messages first, returned in chronological order.
+    When older messages do not fit and a summary is given, it backfills the space reserved for it.
+    """
+    if summary_max_tokens is None:
+        summary_max_tokens = max_tokens // 4
+
+    formatted = []
+    for msg in messages:
+        role, content = _role_and_content(msg)
+        line = f"{role}: {content}"
+        formatted.append((line, estimate_tokens(line) + _SEPARATOR_TOKENS, role, content))
+
+    message_budget = max_tokens + _SEPARATOR_TOKENS  # n lines need only n - 1 separators
+    if summary and sum(cost for _, cost, _, _ in formatted) > message_budget:
+        # Older turns will be dropped, so hold back room for the summary that replaces them
+        message_budget -= summary_max_tokens
+
+    lines = []
+    used = 0
+    dropped = 0
+    for index in range(len(formatted) - 1, -1, -1):
+        line, cost, role, content = formatted[index]
+        if used + cost <= message_budget:
+            lines.append(line)
+            used += cost
+            continue
+
+        if not lines:
+            # Always keep (the start of) the newest message, even when it alone exceeds the budget;
+            # only its content is cut so the role label survives
+            label = f"{role}: "
+            content = truncate_to_tokens(content, message_budget - _SEPARATOR_TOKENS - estimate_tokens(label))
+            line = label + content
+            lines.append(line)
+            used = estimate_tokens(line) + _SEPARATOR_TOKENS
+        dropped = index + 1
+        break
+
+    lines.reverse()
+
+    if dropped and summary:
+        prefix = "Summary of earlier conversation: "
+        # Everything used so far includes one separator per line, which covers the one after the summary
+        summary_text = truncate_to_tokens(summary, max_tokens - used - estimate_tokens(prefix))
+        if summary_text:
+            lines.insert(0, prefix + summary_text)
+
+    return "\n".join(lines)
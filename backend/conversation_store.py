@@ -0,0 +1,356 @@
+"""
+Conversation Store
+Durable SQLite (WAL) persistence for conversation history, rolling summaries, report preferences
+and reports.
+Writes go through on every turn; reads are served from lazily loaded caches.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from memory_store import BoundedConversationStore
+from message_log import MessageLog
+
+class ConversationStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # One connection per thread: WAL lets readers proceed while another thread or worker writes
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._create_tables()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_tables(self):
+        db = self._connection()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages (conversation_id, id);
+            CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at);
+
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                preference TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations (created_at);
+
+            CREATE TABLE IF NOT EXISTS summaries (
+                conversation_id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS reports (
+                id TEXT PRIMARY KEY,
+                conversation_id TEXT,
+                client_name TEXT,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reports_conversation_id ON reports (conversation_id);
+            CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at);
+        """)
+        db.commit()
+
+    def _write(self, sql, params):
+        with self._write_lock:
+            db = self._connection()
+            cursor = db.execute(sql, params)
+            db.commit()
+            return cursor
+
+    # --- Conversations and messages ---
+
+    def ensure_conversation(self, conversation_id):
+        now = datetime.now().isoformat()
+        self._write(
+            "INSERT OR IGNORE INTO conversations (conversation_id, created_at, updated_at) VALUES (?, ?, ?)",
+            (conversation_id, now, now)
+        )
+
+    def conversation_exists(self, conversation_id):
+        return self._connection().execute(
+            "SELECT 1 FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone() is not None
+
+    def append_message(self, conversation_id, message):
+        """Persist one message and return its row id"""
+        created_at = message.get('timestamp') or datetime.now().isoformat()
+        with self._write_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR IGNORE INTO conversations (conversation_id, created_at, updated_at) VALUES (?, ?, ?)",
+                (conversation_id, created_at, created_at)
+            )
+            cursor = db.execute(
+                "INSERT INTO messages (conversation_id, payload, created_at) VALUES (?, ?, ?)",
+                (conversation_id, json.dumps(message), created_at)
+            )
+            db.execute(
+                "UPDATE conversations SET updated_at = ? WHERE conversation_id = ?", (created_at, conversation_id)
+            )
+            db.commit()
+            return cursor.lastrowid
+
+    def load_messages(self, conversation_id, after_id=0):
+        """Messages with row id greater than after_id, oldest first, as (id, message) pairs"""
+        rows = self._connection().execute(
+            "SELECT id, payload FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+            (conversation_id, after_id)
+        ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def last_message_id(self, conversation_id):
+        row = self._connection().execute(
+            "SELECT MAX(id) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def delete_conversation(self, conversation_id):
+        """Delete a conversation and its messages (reports are kept); returns whether it existed"""
+        with self._write_lock:
+            db = self._connection()
+            db.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            db.execute("DELETE FROM summaries WHERE conversation_id = ?", (conversation_id,))
+            cursor = db.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
+            db.commit()
+            return cursor.rowcount > 0
+
+    # --- Rolling summaries ---
+
+    def save_summary(self, conversation_id, record):
+        self._write(
+            "INSERT OR REPLACE INTO summaries (conversation_id, text, version, updated_at) VALUES (?, ?, ?, ?)",
+            (conversation_id, record["text"], record["version"], record.get("updated_at") or datetime.now().isoformat())
+        )
+
+    def get_summary(self, conversation_id):
+        row = self._connection().execute(
+            "SELECT text, version, updated_at FROM summaries WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return {"text": row[0], "version": row[1], "updated_at": row[2]} if row else None
+
+    def delete_summary(self, conversation_id):
+        self._write("DELETE FROM summaries WHERE conversation_id = ?", (conversation_id,))
+
+    # --- Report preferences ---
+
+    def set_preference(self, conversation_id, preference):
+        now = datetime.now().isoformat()
+        self._write(
+            """INSERT INTO conversations (conversation_id, preference, created_at, updated_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(conversation_id) DO UPDATE SET preference = excluded.preference, updated_at = excluded.updated_at""",
+            (conversation_id, preference, now, now)
+        )
+
+    def get_preference(self, conversation_id):
+        row = self._connection().execute(
+            "SELECT preference FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0] if row and row[0] else None
+
+    # --- Reports ---
+
+    def save_report(self, report):
+        self._write(
+            "INSERT OR REPLACE INTO reports (id, conversation_id, client_name, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+            (report['id'], report.get('conversation_id'), report.get('client_name'), json.dumps(report), report['created_at'])
+        )
+
+    def get_report(self, report_id):
+        row = self._connection().execute("SELECT payload FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_reports(self):
+        """Report headers (no content), newest first"""
+        rows = self._connection().execute(
+            "SELECT id, client_name, created_at FROM reports ORDER BY created_at DESC"
+        ).fetchall()
+        return [{"id": row[0], "client_name": row[1], "created_at": row[2]} for row in rows]
+
+class ConversationHistory:
+    """
+    The canonical message log: conversation_id -> MessageLog, written through to the store and
+    cached per conversation. Cached logs are topped up with rows other workers appended since the
+    last read; evicted logs are simply reloaded from the store.
+    """
+
+    def __init__(self, store, max_cached=500, max_idle_seconds=1800):
+        self.store = store
+        # conversation_id -> (last_row_id, MessageLog)
+        self._cache = BoundedConversationStore("history", None, max_cached, max_idle_seconds)
+        # conversation_id -> log index of the latest user message no reply has claimed yet
+        self._pending_turns = {}
+        self._lock = threading.RLock()
+
+    def _load(self, conversation_id):
+        return self._top_up(conversation_id)[0]
+
+    def _top_up(self, conversation_id):
+        """The cached log topped up from the store, and the row ids just added to it, in log order"""
+        with self._lock:
+            cached = self._cache.get(conversation_id)
+            last_id, log = cached if cached is not None else (0, MessageLog())
+            added = []
+            if cached is None or self.store.last_message_id(conversation_id) > last_id:
+                for row_id, message in self.store.load_messages(conversation_id, after_id=last_id):
+                    log.append(message)
+                    added.append(row_id)
+                    last_id = row_id
+                self._cache[conversation_id] = (last_id, log)
+            return log, added
+
+    def __contains__(self, conversation_id):
+        with self._lock:
+            return self._cache.get(conversation_id) is not None or self.store.conversation_exists(conversation_id)
+
+    def __getitem__(self, conversation_id):
+        """Every message of the conversation as dicts"""
+        return self._load(conversation_id).messages()
+
+    def get(self, conversation_id, default=None):
+        return self[conversation_id] if conversation_id in self else default
+
+    def log(self, conversation_id):
+        """The compact MessageLog itself, for readers that only need a few fields"""
+        return self._load(conversation_id)
+
+    def tail(self, conversation_id, limit=None):
+        """The last `limit` messages as dicts (every message when limit is None)"""
+        return self._load(conversation_id).messages(limit)
+
+    def count(self, conversation_id):
+        return len(self._load(conversation_id))
+
+    def start(self, conversation_id):
+        """Create an empty conversation"""
+        self.store.ensure_conversation(conversation_id)
+        self._load(conversation_id)
+
+    def append(self, conversation_id, message):
+        """
+        Persist a message and add it to the cached history; returns the conversation's log and the
+        message's index in it. A user message becomes the conversation's pending turn.
+        """
+        # Held across the insert so no other thread tops the log up past our row before we find it
+        with self._lock:
+            row_id = self.store.append_message(conversation_id, message)
+            # Top up from the store rather than appending locally, so rows written by other workers stay in order
+            log, added = self._top_up(conversation_id)
+            index = len(log) - len(added) + added.index(row_id)
+            if message.get('role') == 'user':
+                self._pending_turns[conversation_id] = index
+            return log, index
+
+    def take_pending_turn(self, conversation_id):
+        """
+        Claim the log index of the latest user message not yet answered, or None. Replies pair
+        with it explicitly, so messages appended in between do not break the turn.
+        """
+        with self._lock:
+            return self._pending_turns.pop(conversation_id, None)
+
+    def delete(self, conversation_id):
+        """Delete the conversation from the store and the cache; returns whether it existed"""
+        with self._lock:
+            try:
+                del self._cache[conversation_id]
+            except KeyError:
+                pass
+            self._pending_turns.pop(conversation_id, None)
+            return self.store.delete_conversation(conversation_id)
+
+    def stats(self):
+        return self._cache.stats()
+
+class ConversationSummaries:
+    """
+    conversation_id -> rolling summary record ({"text", "version", "updated_at"}), written through
+    to the store on every fold so a restart resumes from the last folded turn
+    """
+
+    def __init__(self, store, max_cached=500, max_idle_seconds=1800):
+        self.store = store
+        self._cache = BoundedConversationStore("summaries", None, max_cached, max_idle_seconds)
+
+    def __setitem__(self, conversation_id, record):
+        self.store.save_summary(conversation_id, record)
+        self._cache[conversation_id] = record
+
+    def __delitem__(self, conversation_id):
+        try:
+            del self._cache[conversation_id]
+        except KeyError:
+            pass
+        self.store.delete_summary(conversation_id)
+
+    def get(self, conversation_id, default=None):
+        record = self._cache.get(conversation_id)
+        if record is None:
+            record = self.store.get_summary(conversation_id)
+            if record is None:
+                return default
+            self._cache[conversation_id] = record
+        return record
+
+    def stats(self):
+        return self._cache.stats()
+
+class ConversationPreferences:
+    """conversation_id -> report customization preference, backed by the store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __setitem__(self, conversation_id, preference):
+        self.store.set_preference(conversation_id, preference)
+
+    def get(self, conversation_id, default=None):
+        preference = self.store.get_preference(conversation_id)
+        return default if preference is None else preference
+
+class ReportStore:
+    """report_id -> report dict, backed by the store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __setitem__(self, report_id, report):
+        self.store.save_report(report)
+
+    def __getitem__(self, report_id):
+        report = self.store.get_report(report_id)
+        if report is None:
+            raise KeyError(report_id)
+        return report
+
+    def __contains__(self, report_id):
+        return self.store.get_report(report_id) is not None
+
+    def get(self, report_id, default=None):
+        report = self.store.get_report(report_id)
+        return default if report is None else report
+
+    def list(self):
+        return self.store.list_reports()
+
+# Create global instance
+conversation_store = ConversationStore(os.getenv('CONVERSATION_DB', './conversations.db'))
@@ -0,0 +1,153 @@
+"""
+Embedding Cache
+Content-addressed cache in front of an embeddings model. Vectors are keyed by a hash of
+model name plus chunk text, kept in an LRU and persisted to SQLite, so repeated text
+(a stock greeting turn, a restated question) is embedded once across all conversations.
+"""
+
+import os
+import array
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, model_name, db_path=None, max_entries=20000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.db_path = db_path
+        self.max_entries = max_entries
+
+        # key -> vector; most recently used entries live at the end
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        if self.db_path:
+            try:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS embedding_cache (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        vector BLOB NOT NULL
+                    )
+                """)
+                self._db.commit()
+            except Exception as e:
+                print(f"⚠️ Embedding cache disk backing not available: {e}")
+                self._db = None
+
+    def make_key(self, text):
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, key):
+        """Cached vector for key, or None (caller holds the lock)"""
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+            return vector
+
+        if self._db is not None:
+            try:
+                row = self._db.execute("SELECT vector FROM embedding_cache WHERE key = ?", (key,)).fetchone()
+            except Exception as e:
+                print(f"⚠️ Error reading embedding cache: {e}")
+                row = None
+            if row:
+                vector = array.array('f', row[0]).tolist()
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector
+        return None
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _store(self, pairs):
+        with self._lock:
+            for key, vector in pairs:
+                self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embedding_cache (key, model, vector) VALUES (?, ?, ?)",
+                        [(key, self.model_name, array.array('f', vector).tobytes()) for key, vector in pairs]
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"⚠️ Error writing embedding cache: {e}")
+
+    def embed_documents(self, texts):
+        """Embed only the texts not seen before; duplicates within the batch are embedded once"""
+        keys = [self.make_key(text) for text in texts]
+        vectors = {}
+        missing = OrderedDict()
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in vectors or key in missing:
+                    continue
+                vector = self._lookup(key)
+                if vector is None:
+                    missing[key] = text
+                else:
+                    vectors[key] = vector
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            pairs = list(zip(missing.keys(), embedded))
+            self._store(pairs)
+            vectors.update(pairs)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self.make_key(text)
+        with self._lock:
+            vector = self._lookup(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None
+            }
+
+def create_cached_embeddings(embeddings, model_name):
+    """Wrap an embeddings model with the cache configured from EMBEDDING_CACHE_* environment variables"""
+    if os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'false':
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        model_name,
+        db_path=os.getenv('EMBEDDING_CACHE_DB', './embedding_cache.db') or None,
+        max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '20000'))
+    )
@@ -0,0 +1,187 @@
+"""
+Financial Data
+The extracted financial_info schema, merging of incremental extraction results into a
+per-conversation snapshot, locally computed totals, and a rule-based fast path that reads
+plainly stated balances without a model call.
+"""
+
+import re
+import copy
+
+from json_extract import NUMBER
+
+ASSET_FIELDS = ("rrsp", "tfsa", "investments", "realEstate")
+LIABILITY_FIELDS = ("mortgage", "carLoan", "creditCards")
+GOAL_HORIZONS = ("shortTerm", "mediumTerm", "longTerm")
+
+_EMPTY_FINANCIAL_INFO = {
+    "assets": {"rrsp": 0, "tfsa": 0, "investments": 0, "realEstate": 0, "totalAssets": 0},
+    "liabilities": {"mortgage": 0, "carLoan": 0, "creditCards": 0, "totalLiabilities": 0},
+    "netWorth": 0,
+    "goals": {"shortTerm": [], "mediumTerm": [], "longTerm": []}
+}
+
+# Shape of an extraction result, for validating model output
+FINANCIAL_UPDATE_SCHEMA = {
+    "assets": {field: NUMBER for field in ASSET_FIELDS + ("totalAssets",)},
+    "liabilities": {field: NUMBER for field in LIABILITY_FIELDS + ("totalLiabilities",)},
+    "netWorth": NUMBER,
+    "goals": {horizon: list for horizon in GOAL_HORIZONS}
+}
+
+def empty_financial_info():
+    return copy.deepcopy(_EMPTY_FINANCIAL_INFO)
+
+def _amount(value):
+    """A number from an extracted field, or None when the field was not mentioned"""
+    if value is None or isinstance(value, bool):
+        return None
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(str(value).replace('$', '').replace(',', '').strip())
+        except ValueError:
+            return None
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+def compute_totals(financial_info):
+    """Recompute totalAssets, totalLiabilities and netWorth from the individual fields"""
+    assets = financial_info["assets"]
+    liabilities = financial_info["liabilities"]
+    assets["totalAssets"] = sum(assets.get(field) or 0 for field in ASSET_FIELDS)
+    liabilities["totalLiabilities"] = sum(liabilities.get(field) or 0 for field in LIABILITY_FIELDS)
+    financial_info["netWorth"] = assets["totalAssets"] - liabilities["totalLiabilities"]
+    return financial_info
+
+def merge_financial_info(snapshot, update):
+    """
+    Fold an extraction of new messages into a snapshot. Amounts present in the update replace
+    the snapshot's (a restated balance supersedes the old one); missing or null amounts keep the
+    snapshot's value. Goals accumulate without duplicates. Totals are recomputed.
+    """
+    merged = copy.deepcopy(snapshot) if snapshot else empty_financial_info()
+    update = update or {}
+
+    for section, fields in (("assets", ASSET_FIELDS), ("liabilities", LIABILITY_FIELDS)):
+        values = update.get(section) or {}
+        for field in fields:
+            amount = _amount(values.get(field))
+            if amount is not None:
+                merged[section][field] = amount
+
+    goals = update.get("goals") or {}
+    for horizon in GOAL_HORIZONS:
+        known = merged["goals"].setdefault(horizon, [])
+        seen = {str(goal).strip().lower() for goal in known}
+        for goal in goals.get(horizon) or []:
+            if str(goal).strip() and str(goal).strip().lower() not in seen:
+                known.append(goal)
+                seen.add(str(goal).strip().lower())
+
+    return compute_totals(merged)
+
+# --- Rule-based fast path ---
+
+_AMOUNT_RE = re.compile(
+    r"(?<![\w.])\$?\s?(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(k|m|thousand|million)?(?![\w])",
+    re.IGNORECASE
+)
+_CATEGORY_RES = [
+    ("assets", "rrsp", re.compile(r"\brrsps?\b", re.IGNORECASE)),
+    ("assets", "tfsa", re.compile(r"\btfsas?\b", re.IGNORECASE)),
+    ("assets", "investments", re.compile(
+        r"\b(?:investments?|invested|stocks?|portfolio|brokerage|mutual funds?|etfs?|non-registered)\b", re.IGNORECASE)),
+    ("assets", "realEstate", re.compile(
+        r"\b(?:real estate|property|house|home|condo|cottage)\b(?:\s+(?:is\s+)?(?:worth|valued|value))?", re.IGNORECASE)),
+    ("liabilities", "mortgage", re.compile(r"\bmortgages?\b", re.IGNORECASE)),
+    ("liabilities", "carLoan", re.compile(r"\b(?:car|auto|vehicle) loans?\b", re.IGNORECASE)),
+    ("liabilities", "creditCards", re.compile(r"\bcredit cards?(?: debt| balances?)?\b", re.IGNORECASE)),
+]
+# Amounts next to these are real but outside the schema (income, budgets, rates)
+_OUT_OF_SCHEMA_RE = re.compile(
+    r"\b(?:salary|income|earn|earns|earning|make|makes|paid|rent|budget|per (?:month|year|week)|a (?:month|year|week)|"
+    r"monthly|annually|yearly|years?|months?|age|old|rate)\b|%",
+    re.IGNORECASE
+)
+# Statements the rules cannot resolve safely: debts phrased against an asset ("I owe 320,000 on my
+# house"), changes rather than balances, negations, hypotheticals and corrections
+_AMBIGUOUS_RE = re.compile(
+    r"\b(?:owe|owes|owed|owing|left on|remaining on|down|up|lost|gained|paid off|pay off|no longer|"
+    r"don'?t have|do not have|used to|sold|if i|what if|should i|would|could|instead|actually|wrong|correction)\b",
+    re.IGNORECASE
+)
+# Goals are only extracted by the model
+_GOAL_RE = re.compile(
+    r"\b(?:goals?|priority|priorities|save for|saving for|want to|wants to|plan to|planning to|hope|hoping|"
+    r"wish|dream|aim to|buy|buying|purchase|afford|emergency fund|retire|retirement|someday|eventually)\b",
+    re.IGNORECASE
+)
+_CLAUSE_RE = re.compile(r"[.;!?\n]|\band\b|\bbut\b", re.IGNORECASE)
+_MAX_GAP = 40
+
+def _parse_amount(number, scale):
+    value = float(number.replace(',', ''))
+    scale = (scale or '').lower()
+    if scale in ('k', 'thousand'):
+        value *= 1000
+    elif scale in ('m', 'million'):
+        value *= 1000000
+    return int(value) if value.is_integer() else value
+
+def _clause_mentions(clause):
+    """(update entries, confident) for one clause"""
+    amounts = []
+    for match in _AMOUNT_RE.finditer(clause):
+        value = _parse_amount(match.group(1), match.group(2))
+        # Bare small numbers ("3 kids", "age 45") are counts, not balances
+        if '$' in match.group(0) or match.group(2) or ',' in match.group(1) or value >= 1000:
+            amounts.append((match.start(), match.end(), value))
+    categories = [(match.start(), match.end(), section, field)
+                  for section, field, pattern in _CATEGORY_RES for match in pattern.finditer(clause)]
+
+    entries = []
+    for start, end, value in amounts:
+        nearest = None
+        for cat_start, cat_end, section, field in categories:
+            gap = cat_start - end if cat_start >= end else start - cat_end
+            if 0 <= gap <= _MAX_GAP and (nearest is None or gap < nearest[0]):
+                nearest = (gap, section, field)
+        if nearest is not None:
+            entries.append((nearest[1], nearest[2], value))
+        elif not _OUT_OF_SCHEMA_RE.search(clause):
+            # An amount we cannot place: let the model read it
+            return [], False
+
+    fields = [(section, field) for section, field, _ in entries]
+    if len(fields) != len(set(fields)):
+        # Two amounts for one field in a clause (e.g. a change from one to another)
+        return [], False
+    return entries, True
+
+def extract_financial_mentions(messages):
+    """
+    Read balances the client stated plainly ("$45k in my TFSA", "mortgage of 320,000") from new
+    messages. Returns (update, confident); when confident is False the caller should use the model.
+    Only the client's own messages are read, since advisor replies often contain illustrative figures.
+    Confident means every one of those messages stated at least one balance the rules placed, and
+    nothing else the model would extract (goals, debts against an asset, changes).
+    """
+    update = {"assets": {}, "liabilities": {}, "goals": {}}
+    for message in messages:
+        if message.get('role') != 'user':
+            continue
+        content = message.get('content') or ''
+        if _AMBIGUOUS_RE.search(content) or _GOAL_RE.search(content):
+            return update, False
+        placed = 0
+        for clause in _CLAUSE_RE.split(content):
+            entries, confident = _clause_mentions(clause)
+            if not confident:
+                return update, False
+            placed += len(entries)
+            for section, field, value in entries:
+                # A later message restating a balance supersedes an earlier one
+                update[section][field] = value
+        if not placed:
+            # Nothing the rules could read; the message may still matter to the model
+            return update, False
+    return update, True
@@ -0,0 +1,246 @@
+"""
+Hybrid Search
+In-process BM25 inverted index over conversation chunks, maintained incrementally as
+turns arrive, and score fusion with vector-store similarity. BM25 catches exact terms
+(account names, dollar figures, "RRSP") that embeddings blur; vectors catch paraphrases.
+"""
+
+import re
+import json
+import math
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+_TOKEN_RE = re.compile(r"\$?\d[\d,]*(?:\.\d+)?k?\b|[a-z][a-z0-9']*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have i in is it its me my of on or so that the "
+    "this to was we what with you your".split()
+)
+
+def tokenize(text):
+    """Lowercase word tokens with amounts normalized, so "$45k", "45,000" and "45000" match"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token[0] == '$' or token[0].isdigit():
+            number = token.lstrip('$').replace(',', '')
+            try:
+                value = float(number[:-1]) * 1000 if number.endswith('k') else float(number)
+                token = f"{value:g}" if value < 1e15 else number
+            except ValueError:
+                token = number
+        elif token in _STOPWORDS:
+            continue
+        tokens.append(token)
+    return tokens
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+        # chunk_id -> (text, metadata, length)
+        self._chunks = {}
+        # term -> {chunk_id: term frequency}
+        self._postings = {}
+        # conversation_id -> set of chunk ids
+        self._by_conversation = {}
+        # (conversation_id, text) -> chunk_id, so re-indexing the same chunk is a no-op
+        self._ids = {}
+        self._next_id = 0
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def add(self, text, metadata):
+        """Index one chunk; returns its id"""
+        conversation_id = metadata.get("conversation_id")
+        with self._lock:
+            existing = self._ids.get((conversation_id, text))
+            if existing is not None:
+                return existing
+
+            chunk_id = self._next_id
+            self._next_id += 1
+            tokens = tokenize(text)
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, frequency in frequencies.items():
+                self._postings.setdefault(token, {})[chunk_id] = frequency
+
+            self._chunks[chunk_id] = (text, dict(metadata), len(tokens))
+            self._by_conversation.setdefault(conversation_id, set()).add(chunk_id)
+            self._ids[(conversation_id, text)] = chunk_id
+            self._total_length += len(tokens)
+            return chunk_id
+
+    def remove(self, conversation_id, text):
+        """Drop one chunk; returns whether it was indexed"""
+        with self._lock:
+            chunk_id = self._ids.pop((conversation_id, text), None)
+            if chunk_id is None:
+                return False
+            _, _, length = self._chunks.pop(chunk_id)
+            self._total_length -= length
+            chunk_ids = self._by_conversation.get(conversation_id)
+            if chunk_ids is not None:
+                chunk_ids.discard(chunk_id)
+                if not chunk_ids:
+                    del self._by_conversation[conversation_id]
+            for token in set(tokenize(text)):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[token]
+            return True
+
+    def remove_conversation(self, conversation_id):
+        """Drop every chunk of a conversation; returns how many were removed"""
+        with self._lock:
+            chunk_ids = self._by_conversation.pop(conversation_id, set())
+            for chunk_id in chunk_ids:
+                text, _, length = self._chunks.pop(chunk_id)
+                del self._ids[(conversation_id, text)]
+                self._total_length -= length
+                for token in set(tokenize(text)):
+                    postings = self._postings.get(token)
+                    if postings is not None:
+                        postings.pop(chunk_id, None)
+                        if not postings:
+                            del self._postings[token]
+            return len(chunk_ids)
+
+    def search(self, query, conversation_id=None, k=10):
+        """Top-k (score, text, metadata) matches, optionally restricted to one conversation"""
+        with self._lock:
+            count = len(self._chunks)
+            if not count:
+                return []
+            allowed = self._by_conversation.get(conversation_id, set()) if conversation_id else None
+            if allowed is not None and not allowed:
+                return []
+            average_length = self._total_length / count
+
+            scores = {}
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                if allowed is not None and len(allowed) < len(postings):
+                    matches = ((chunk_id, postings[chunk_id]) for chunk_id in allowed if chunk_id in postings)
+                else:
+                    matches = ((chunk_id, frequency) for chunk_id, frequency in postings.items()
+                               if allowed is None or chunk_id in allowed)
+                for chunk_id, frequency in matches:
+                    length = self._chunks[chunk_id][2]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(score, self._chunks[chunk_id][0], self._chunks[chunk_id][1]) for chunk_id, score in top]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chunks": len(self._chunks),
+                "terms": len(self._postings),
+                "conversations": len(self._by_conversation)
+            }
+
+def fuse_results(keyword_results, vector_results, vector_weight=0.5):
+    """
+    Merge (score, text, metadata) lists from BM25 and the vector store into one ranking.
+    BM25 scores are scaled by the best keyword score; vector relevance is already in [0, 1].
+    """
+    best_keyword = max((score for score, _, _ in keyword_results), default=0.0)
+    merged = {}
+
+    for score, text, metadata in keyword_results:
+        key = (metadata.get("conversation_id"), text)
+        merged[key] = {
+            "content": text,
+            "metadata": metadata,
+            "bm25_score": round(score, 4),
+            "vector_score": None,
+            "keyword": score / best_keyword if best_keyword else 0.0,
+            "vector": 0.0
+        }
+
+    for score, text, metadata in vector_results:
+        key = (metadata.get("conversation_id"), text)
+        entry = merged.setdefault(key, {
+            "content": text,
+            "metadata": metadata,
+            "bm25_score": None,
+            "keyword": 0.0
+        })
+        relevance = min(max(score, 0.0), 1.0)
+        if entry.get("vector_score") is None or relevance > entry["vector"]:
+            entry["vector_score"] = round(relevance, 4)
+            entry["vector"] = relevance
+
+    results = []
+    for entry in merged.values():
+        entry["score"] = round(vector_weight * entry.pop("vector") + (1 - vector_weight) * entry.pop("keyword"), 4)
+        results.append(entry)
+    results.sort(key=lambda entry: entry["score"], reverse=True)
+    return results
+
+class SearchResultCache:
+    """Short-lived cache of rankings, so following a cursor to the next page usually does not search again"""
+
+    def __init__(self, ttl_seconds=60, max_entries=256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (results, created_at); most recently used entries live at the end
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query, conversation_id, min_score):
+        return hashlib.sha256(json.dumps([query, conversation_id, min_score]).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, results):
+        with self._lock:
+            self._entries[key] = (results, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "ttl_seconds": self.ttl_seconds}
+
+def encode_cursor(query, conversation_id, min_score, offset):
+    """Opaque, self-contained cursor: the next page can be recomputed even after the cache entry expires"""
+    raw = json.dumps({"q": query, "c": conversation_id, "m": min_score, "o": offset}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """(query, conversation_id, min_score, offset) from a cursor; raises ValueError if malformed"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return data["q"], data["c"], float(data["m"]), int(data["o"])
+    except Exception as e:
+        raise ValueError("Invalid search cursor") from e
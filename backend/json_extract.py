@@ -0,0 +1,126 @@
+"""
+JSON Extraction
+Incremental extraction of the first complete, schema-valid JSON object from model output.
+Text can be fed as it streams in; scanning stops as soon as an object closes, so trailing
+prose, code fences or a second object never reach the parser.
+"""
+
+import json
+
+# Leaf types for schemas: amounts may come back as numbers, numeric strings or null
+NUMBER = (int, float, str, type(None))
+
+class JSONExtractionError(ValueError):
+    pass
+
+def validate(value, schema, path="$"):
+    """
+    Check value against a shape schema: dicts of expected keys whose leaves are types or
+    tuples of types. Missing keys are allowed and extra keys are ignored.
+    """
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise JSONExtractionError(f"{path} should be an object")
+        if path == "$" and schema and not any(key in value for key in schema):
+            # Otherwise a nested object on its own would pass as the whole answer
+            raise JSONExtractionError("$ has none of the expected keys")
+        for key, child in schema.items():
+            if key in value:
+                validate(value[key], child, f"{path}.{key}")
+    elif schema is not None:
+        allowed = schema if isinstance(schema, tuple) else (schema,)
+        # bool is an int subclass, but true/false is never a valid amount
+        if not isinstance(value, allowed) or (isinstance(value, bool) and bool not in allowed):
+            raise JSONExtractionError(f"{path} has unexpected type {type(value).__name__}")
+
+class IncrementalJSONParser:
+    def __init__(self, schema=None):
+        self.schema = schema
+        self.result = None
+        self.done = False
+
+        self._text = ""
+        self._pos = 0
+        # Index of the '{' that opened the current candidate object, if any
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        """Add text; returns the first complete valid object once it has closed, else None"""
+        if self.done:
+            return self.result
+        self._text += chunk
+        return self._scan()
+
+    def _scan(self):
+        text = self._text
+        while self._pos < len(text):
+            char = text[self._pos]
+            if self._start is None:
+                if char == '{':
+                    self._start = self._pos
+                    self._depth = 1
+                    self._in_string = False
+                    self._escape = False
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:self._pos + 1]
+                    try:
+                        value = json.loads(candidate)
+                        if self.schema is not None:
+                            validate(value, self.schema)
+                    except ValueError:
+                        # Prose like "{name}" or an object of the wrong shape: resume just after its brace
+                        self._pos = self._start + 1
+                        self._start = None
+                        continue
+                    self.result = value
+                    self.done = True
+                    self._pos += 1
+                    return value
+            self._pos += 1
+        return None
+
+    def close(self):
+        """Finish the input; returns the object or raises JSONExtractionError"""
+        # An unbalanced brace in leading prose can swallow the real object: retry after it
+        while not self.done and self._start is not None:
+            self._pos = self._start + 1
+            self._start = None
+            self._scan()
+        if not self.done:
+            raise JSONExtractionError("No complete JSON object in model output")
+        return self.result
+
+def extract_json(text, schema=None):
+    """The first complete, schema-valid JSON object in text"""
+    parser = IncrementalJSONParser(schema)
+    parser.feed(text or "")
+    return parser.close()
+
+def extract_json_from_stream(chunks, schema=None):
+    """Consume streamed text only until the first complete, schema-valid object closes"""
+    parser = IncrementalJSONParser(schema)
+    try:
+        for chunk in chunks:
+            if parser.feed(chunk) is not None:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return parser.close()
@@ -0,0 +1,192 @@
+"""
+LLM Backends
+Pluggable model clients behind get_gemini_response(), selected with LLM_BACKEND:
+- gemini: Google Gemini via google.generativeai (default)
+- stub: offline deterministic backend for load testing and benchmarks
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+
+DEFAULT_GEMINI_MODEL = 'gemini-1.5-flash'
+
+class GeminiBackend:
+    def __init__(self, model_name=DEFAULT_GEMINI_MODEL, api_key=None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    @staticmethod
+    def _chunk_text(chunk):
+        try:
+            return chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety or finish metadata) carry nothing to stream
+            return ""
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str):
+        # stream=True makes Gemini return partial candidates as soon as they are decoded
+        for chunk in self.model.generate_content(prompt, stream=True):
+            delta = self._chunk_text(chunk)
+            if delta:
+                yield delta
+
+    async def generate_async(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream_async(self, prompt: str):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            delta = self._chunk_text(chunk)
+            if delta:
+                yield delta
+
+# Canned outputs used when LLM_STUB_RESPONSES_FILE is not set
+DEFAULT_STUB_RESPONSES = {
+    "chat": [
+        "Thanks for sharing that. Based on what you've told me, a good first step is to build an "
+        "emergency fund covering three to six months of expenses, then direct extra savings to your "
+        "RRSP and TFSA. Could you tell me more about your current debts and retirement timeline?",
+        "That's a solid position to start from. I'd recommend reviewing your asset allocation against "
+        "your risk tolerance and making sure high-interest debt is paid down before increasing "
+        "investment contributions. What are your main goals for the next five years?"
+    ],
+    "report": [
+        "## 1. EXECUTIVE SUMMARY\nThe client has a stable financial foundation with room to optimize "
+        "savings and debt repayment.\n\n## 2. FINANCIAL HEALTH ASSESSMENT\n- **Assets:** As discussed in "
+        "the conversation\n- **Liabilities:** As discussed in the conversation\n\n## 3. ACTION ITEMS AND "
+        "NEXT STEPS\n- **Immediate Actions:** Review budget and emergency fund\n- **Long-term Actions:** "
+        "Maximize registered account contributions"
+    ],
+    "extraction": [
+        json.dumps({
+            "assets": {"rrsp": 45000, "tfsa": 20000, "investments": 15000, "realEstate": 0, "totalAssets": 80000},
+            "liabilities": {"mortgage": 0, "carLoan": 12000, "creditCards": 3000, "totalLiabilities": 15000},
+            "netWorth": 65000,
+            "goals": {"shortTerm": ["Build emergency fund"], "mediumTerm": ["Buy a home"], "longTerm": ["Retire at 60"]}
+        })
+    ]
+}
+
+class StubLLMBackend:
+    """Deterministic offline backend: the same prompt always yields the same text and latency"""
+
+    def __init__(self, latency_ms=300.0, latency_jitter=0.5, latency_distribution="lognormal",
+                 tokens_per_second=50.0, responses=None, seed=0):
+        self.model_name = "stub"
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.responses = responses or DEFAULT_STUB_RESPONSES
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        responses = None
+        responses_file = os.getenv('LLM_STUB_RESPONSES_FILE')
+        if responses_file:
+            with open(responses_file, 'r', encoding='utf-8') as f:
+                responses = json.load(f)
+            if isinstance(responses, list):
+                responses = {"chat": responses}
+
+        return cls(
+            latency_ms=float(os.getenv('LLM_STUB_LATENCY_MS', '300')),
+            latency_jitter=float(os.getenv('LLM_STUB_LATENCY_JITTER', '0.5')),
+            latency_distribution=os.getenv('LLM_STUB_LATENCY_DIST', 'lognormal').lower(),
+            tokens_per_second=float(os.getenv('LLM_STUB_TOKENS_PER_SEC', '50')),
+            responses=responses,
+            seed=int(os.getenv('LLM_STUB_SEED', '0'))
+        )
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(f"{self.seed}\x00{prompt}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    @staticmethod
+    def _classify(prompt):
+        if '"assets"' in prompt and 'JSON' in prompt:
+            return "extraction"
+        if 'financial report' in prompt.lower():
+            return "report"
+        return "chat"
+
+    def _plan(self, prompt):
+        """Pick the canned output and time-to-first-token for a prompt"""
+        rng = self._rng(prompt)
+        candidates = self.responses.get(self._classify(prompt)) or self.responses.get("chat") or [""]
+        text = candidates[rng.randrange(len(candidates))]
+
+        base = self.latency_ms / 1000.0
+        if self.latency_distribution == "fixed":
+            first_token_delay = base
+        elif self.latency_distribution == "uniform":
+            first_token_delay = rng.uniform(base * (1 - self.latency_jitter), base * (1 + self.latency_jitter))
+        else:
+            # lognormal with median latency_ms gives the long right tail real LLM calls show
+            first_token_delay = base * rng.lognormvariate(0, self.latency_jitter)
+        return text, max(0.0, first_token_delay)
+
+    def _tokens(self, text):
+        # Whitespace-delimited words keep their trailing separator so joining the stream restores the text
+        tokens = []
+        start = 0
+        for i, char in enumerate(text):
+            if char.isspace() and (i + 1 == len(text) or not text[i + 1].isspace()):
+                tokens.append(text[start:i + 1])
+                start = i + 1
+        if start < len(text):
+            tokens.append(text[start:])
+        return tokens
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def generate(self, prompt: str) -> str:
+        text, first_token_delay = self._plan(prompt)
+        time.sleep(first_token_delay + len(self._tokens(text)) * self._token_delay())
+        return text
+
+    def stream(self, prompt: str):
+        text, first_token_delay = self._plan(prompt)
+        time.sleep(first_token_delay)
+        token_delay = self._token_delay()
+        for token in self._tokens(text):
+            yield token
+            time.sleep(token_delay)
+
+    async def generate_async(self, prompt: str) -> str:
+        text, first_token_delay = self._plan(prompt)
+        await asyncio.sleep(first_token_delay + len(self._tokens(text)) * self._token_delay())
+        return text
+
+    async def stream_async(self, prompt: str):
+        text, first_token_delay = self._plan(prompt)
+        await asyncio.sleep(first_token_delay)
+        token_delay = self._token_delay()
+        for token in self._tokens(text):
+            yield token
+            await asyncio.sleep(token_delay)
+
+def create_llm_backend(api_key=None, model_name=DEFAULT_GEMINI_MODEL):
+    """Build the backend selected by LLM_BACKEND; returns None when Gemini has no API key"""
+    backend_name = os.getenv('LLM_BACKEND', 'gemini').lower()
+
+    if backend_name == 'stub':
+        return StubLLMBackend.from_env()
+    if backend_name != 'gemini':
+        raise ValueError(f"Unknown LLM_BACKEND: {backend_name}")
+    if not api_key:
+        return None
+    return GeminiBackend(model_name, api_key)
@@ -0,0 +1,162 @@
+"""
+LLM Response Cache
+Prompt-keyed cache in front of the Gemini model with LRU/TTL eviction
+and optional SQLite persistence
+"""
+
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+class LLMResponseCache:
+    def __init__(self, max_entries=512, ttl_seconds=3600, db_path=None, enabled=True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.enabled = enabled
+
+        # key -> (response, created_at); most recently used entries live at the end
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes_since_purge = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if self.enabled and self.db_path:
+            try:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+                self._db.commit()
+                print(f"✅ LLM response cache persisted to {self.db_path}")
+            except Exception as e:
+                print(f"⚠️ LLM cache disk backing not available: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str) -> str:
+        """Hash a whitespace-normalized prompt together with the model name"""
+        normalized = _WHITESPACE_RE.sub(' ', prompt).strip()
+        return hashlib.sha256(f"{model_name}\x00{normalized}".encode('utf-8')).hexdigest()
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def get(self, prompt: str, model_name: str, allow_expired=False):
+        """Return the cached response for a prompt, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(prompt, model_name)
+        # allow_expired serves stale answers as a fallback while the model is unavailable
+        now = 0 if allow_expired else time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._is_expired(entry[1], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except Exception as e:
+                    print(f"⚠️ Error reading LLM cache: {e}")
+                    row = None
+
+                if row and not self._is_expired(row[1], now):
+                    self._store_in_memory(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, prompt: str, model_name: str, response: str):
+        """Store a model response for a prompt"""
+        if not self.enabled or not response:
+            return
+
+        key = self.make_key(prompt, model_name)
+        now = time.time()
+
+        with self._lock:
+            self._store_in_memory(key, response, now)
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                        (key, model_name, response, now)
+                    )
+                    self._writes_since_purge += 1
+                    if self.ttl_seconds > 0 and self._writes_since_purge >= 100:
+                        self._db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+                        self._writes_since_purge = 0
+                    self._db.commit()
+                except Exception as e:
+                    print(f"⚠️ Error writing LLM cache: {e}")
+
+    def _store_in_memory(self, key, response, created_at):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached response, including the disk backing"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None
+            }
+
+# Create global instance
+llm_cache = LLMResponseCache(
+    max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '512')),
+    ttl_seconds=int(os.getenv('LLM_CACHE_TTL_SECONDS', '3600')),
+    db_path=os.getenv('LLM_CACHE_DB') or None,
+    enabled=os.getenv('LLM_CACHE_ENABLED', 'true').lower() != 'false'
+)
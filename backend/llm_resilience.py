@@ -0,0 +1,790 @@
+"""
+LLM Call Resilience
+Per-call deadlines, retries with jittered backoff on transient errors,
+optional hedged requests for latency-sensitive lanes and a circuit breaker
+"""
+
+import os
+import time
+import queue
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import AsyncExitStack, ExitStack, closing, nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# google.api_core exception names that are worth retrying; matched by name so this
+# module does not depend on the Gemini client being installed
+TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted", "RetryError"
+}
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when a model call does not finish within its per-call deadline"""
+
+def is_transient_error(error):
+    """Whether an exception from the model client is worth retrying"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+class _StreamWorker:
+    """Runs one backend stream in its own thread, posting (worker, kind, value) events to a shared queue"""
+
+    def __init__(self, events, slot, stream_fn, args, kwargs):
+        self.events = events
+        self.cancelled = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(slot, stream_fn, args, kwargs), name="llm-stream", daemon=True
+        )
+        self._thread.start()
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def _run(self, slot, stream_fn, args, kwargs):
+        try:
+            self._stream(slot, stream_fn, args, kwargs)
+        except Exception as e:
+            # A hedge's slot wait timed out
+            self.events.put((self, "error", e))
+
+    def _stream(self, slot, stream_fn, args, kwargs):
+        # The slot is held until the backend iterator is closed, not just until the consumer gives up
+        with slot:
+            if self.cancelled.is_set():
+                return
+            iterator = None
+            try:
+                iterator = stream_fn(*args, **kwargs)
+                for delta in iterator:
+                    if self.cancelled.is_set():
+                        return
+                    self.events.put((self, "delta", delta))
+                self.events.put((self, "done", None))
+            except Exception as e:
+                self.events.put((self, "error", e))
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+
+class ResilientLLMCaller:
+    def __init__(self, deadlines, max_attempts=3, base_delay=0.5, max_delay=8.0,
+                 hedge_lanes=(), hedge_after=None, hedge_percentile=0.95, hedge_min_samples=20,
+                 max_workers=32, first_delta_deadlines=None, stream_deadlines=None, chunk_deadline=15.0,
+                 scheduler=None, breaker=None):
+        self.deadlines = deadlines
+        # Streams: seconds to the first delta, for the whole stream, and between two deltas
+        self.first_delta_deadlines = first_delta_deadlines or dict(deadlines)
+        self.stream_deadlines = stream_deadlines or dict(deadlines)
+        self.chunk_deadline = chunk_deadline
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_lanes = set(hedge_lanes)
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.scheduler = scheduler
+        self.breaker = breaker
+
+        self.latencies = {lane: LatencyTracker() for lane in deadlines}
+        self.first_delta_latencies = {lane: LatencyTracker() for lane in deadlines}
+        # Workers may wait for a hedge slot while slot holders run, so keep this at least twice the scheduler cap
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        # Timed-out attempts whose backend call is still running, and still holding its slot
+        self._abandoned = set()
+        self.counters = {
+            "calls": 0, "retries": 0, "deadline_exceeded": 0, "queue_timeouts": 0, "hedges": 0, "hedge_wins": 0
+        }
+
+    def set_scheduler(self, scheduler):
+        """
+        LLMScheduler (synchronous API) or AsyncLLMScheduler (asyncio API) whose lane slots the backend
+        calls hold. Every attempt and every hedge takes its own slot and keeps it until its backend
+        call has actually returned, so work abandoned on a deadline still counts against the cap.
+        Waiting for a slot counts against the caller's deadline, so a queue stuck behind hung calls
+        fails the request instead of holding it indefinitely.
+        """
+        self.scheduler = scheduler
+
+    def set_breaker(self, breaker):
+        """
+        CircuitBreaker to report outcomes to. Latency is measured from the moment the attempt holds
+        its slot, and streams report their time to the first delta rather than their full length.
+        """
+        self.breaker = breaker
+
+    def _slot(self, lane, timeout=None):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(lane, None if timeout is None else max(0.0, timeout))
+
+    def _queue_timeout(self, lane):
+        self._count("queue_timeouts")
+        return LLMDeadlineExceeded(f"{lane} call ran out of time waiting for a model slot")
+
+    def _hold_slot(self, lane, until):
+        """
+        Block for a slot until the monotonic time until; the returned ExitStack lets a worker
+        thread release it when its call ends
+        """
+        held = ExitStack()
+        try:
+            held.enter_context(self._slot(lane, until - time.monotonic()))
+        except TimeoutError:
+            raise self._queue_timeout(lane) from None
+        return held
+
+    async def _hold_slot_async(self, held, lane, until):
+        """Wait for a slot until the event loop time until and keep it in the AsyncExitStack held"""
+        try:
+            await held.enter_async_context(self._slot(lane, until - asyncio.get_running_loop().time()))
+        except TimeoutError:
+            raise self._queue_timeout(lane) from None
+
+    def _abandon(self, attempts):
+        """Account for given-up attempts whose backend calls are still running in their slots"""
+        with self._lock:
+            self._abandoned = {attempt for attempt in self._abandoned if not attempt.done()}
+            self._abandoned.update(attempt for attempt in attempts if not attempt.done())
+            running = len(self._abandoned)
+        if self.scheduler is not None and running >= self.scheduler.max_concurrency:
+            print(f"⚠️ All {running} LLM slots are held by calls that already exceeded their deadline")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries from many callers instead of synchronizing them
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def hedge_delay(self, lane, first_delta=False):
+        """
+        Seconds to wait for the primary request (or, for streams, its first delta) before firing a
+        hedge, or None to not hedge
+        """
+        if lane not in self.hedge_lanes:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        tracker = (self.first_delta_latencies if first_delta else self.latencies).get(lane)
+        if tracker is None or len(tracker) < self.hedge_min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def _record_success(self, lane, latency, hedged_won, first_delta=False):
+        (self.first_delta_latencies if first_delta else self.latencies)[lane].record(latency)
+        if hedged_won:
+            self._count("hedge_wins")
+        if self.breaker is not None:
+            self.breaker.record_success(latency, lane)
+
+    def _record_failure(self, error):
+        # Only outages count: a safety block or an invalid argument says nothing about the dependency's health
+        if self.breaker is not None and (isinstance(error, LLMDeadlineExceeded) or is_transient_error(error)):
+            self.breaker.record_failure()
+
+    def _hedge_at(self, lane, started_at, first_delta_at):
+        hedge_after = self.hedge_delay(lane, first_delta=True)
+        if hedge_after is None or started_at + hedge_after >= first_delta_at:
+            return None
+        return started_at + hedge_after
+
+    # --- Synchronous API (Flask / Socket.IO) ---
+
+    def call(self, lane, fn, *args, **kwargs):
+        """Run fn under the lane's deadline, retrying transient errors"""
+        self._count("calls")
+        deadline_at = time.monotonic() + self.deadlines[lane]
+        attempt = 0
+
+        while True:
+            attempt += 1
+            slot = self._hold_slot(lane, deadline_at)
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                slot.close()
+                raise self._queue_timeout(lane)
+
+            try:
+                return self._attempt(lane, remaining, slot, fn, args, kwargs)
+            except LLMDeadlineExceeded as e:
+                self._count("deadline_exceeded")
+                self._record_failure(e)
+                raise
+            except Exception as e:
+                delay = self._backoff(attempt)
+                if not is_transient_error(e) or attempt >= self.max_attempts or time.monotonic() + delay >= deadline_at:
+                    self._record_failure(e)
+                    raise
+                print(f"⚠️ Transient LLM error ({type(e).__name__}), retrying in {delay:.2f}s: {e}")
+                self._count("retries")
+                time.sleep(delay)
+
+    def _run(self, lane, slot, deadline_at, abandoned, fn, args, kwargs):
+        """Worker body: holds the attempt's slot (a hedge takes its own) until fn returns"""
+        with slot if slot is not None else self._slot(lane, deadline_at - time.monotonic()):
+            if abandoned.is_set():
+                raise LLMDeadlineExceeded(f"{lane} call was abandoned before it started")
+            return fn(*args, **kwargs)
+
+    def _attempt(self, lane, remaining, slot, fn, args, kwargs):
+        started_at = time.monotonic()
+        deadline_at = started_at + remaining
+        abandoned = threading.Event()
+        try:
+            primary = self._executor.submit(self._run, lane, slot, deadline_at, abandoned, fn, args, kwargs)
+        except Exception:
+            slot.close()
+            raise
+        pending = {primary}
+
+        try:
+            hedge_after = self.hedge_delay(lane)
+            if hedge_after is not None and hedge_after < remaining:
+                done, _ = wait(pending, timeout=hedge_after)
+                if not done:
+                    self._count("hedges")
+                    pending.add(self._executor.submit(self._run, lane, None, deadline_at, abandoned, fn, args, kwargs))
+
+            last_error = None
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    # Worker threads cannot be interrupted; they finish in the background, holding their slots
+                    raise LLMDeadlineExceeded(f"{lane} call exceeded its {self.deadlines[lane]}s deadline")
+                for future in done:
+                    if future.exception() is None:
+                        self._record_success(lane, time.monotonic() - started_at, future is not primary)
+                        return future.result()
+                    last_error = future.exception()
+            raise last_error
+        finally:
+            # A hedge still queued for its slot skips the model call once the outcome is decided
+            abandoned.set()
+            self._abandon(pending)
+
+    def stream(self, lane, stream_fn, *args, **kwargs):
+        """
+        Iterate stream_fn with deadlines for the first delta, for each gap between deltas and for the
+        whole stream, retrying transient errors that happen before the first delta. On hedged lanes
+        a second stream starts when the first delta is late, and the first to produce one wins.
+        """
+        self._count("calls")
+        finish_at = time.monotonic() + self.stream_deadlines[lane]
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            first_delta_at = min(time.monotonic() + self.first_delta_deadlines[lane], finish_at)
+            slot = self._hold_slot(lane, first_delta_at)
+            try:
+                with closing(self._stream_attempt(lane, slot, first_delta_at, finish_at, stream_fn, args, kwargs)) as deltas:
+                    for delta in deltas:
+                        started = True
+                        yield delta
+                return
+            except LLMDeadlineExceeded as e:
+                self._count("deadline_exceeded")
+                self._record_failure(e)
+                raise
+            except Exception as e:
+                delay = self._backoff(attempt)
+                if started or not is_transient_error(e) or attempt >= self.max_attempts:
+                    self._record_failure(e)
+                    raise
+                print(f"⚠️ Transient LLM error ({type(e).__name__}), retrying stream in {delay:.2f}s: {e}")
+                self._count("retries")
+                time.sleep(delay)
+
+    @staticmethod
+    def _next_event(events, until):
+        try:
+            return events.get(timeout=max(0.0, until - time.monotonic()))
+        except queue.Empty:
+            return None
+
+    def _stream_attempt(self, lane, slot, first_delta_at, finish_at, stream_fn, args, kwargs):
+        started_at = time.monotonic()
+        hedge_at = self._hedge_at(lane, started_at, first_delta_at)
+        events = queue.Queue()
+        primary = _StreamWorker(events, slot, stream_fn, args, kwargs)
+        workers = [primary]
+
+        try:
+            winner = None
+            while winner is None:
+                event = self._next_event(events, hedge_at if hedge_at is not None else first_delta_at)
+                if event is None:
+                    if hedge_at is not None:
+                        hedge_at = None
+                        self._count("hedges")
+                        hedge_slot = self._slot(lane, first_delta_at - time.monotonic())
+                        workers.append(_StreamWorker(events, hedge_slot, stream_fn, args, kwargs))
+                        continue
+                    raise LLMDeadlineExceeded(f"{lane} stream produced no output within its deadline")
+                worker, kind, value = event
+                if kind == "error":
+                    workers.remove(worker)
+                    if not workers:
+                        raise value
+                    continue
+                winner = worker
+                self._record_success(lane, time.monotonic() - started_at, winner is not primary, first_delta=True)
+                for other in workers:
+                    if other is not winner:
+                        other.cancelled.set()
+                if kind == "done":
+                    return
+                yield value
+
+            while True:
+                event = self._next_event(events, min(time.monotonic() + self.chunk_deadline, finish_at))
+                if event is None:
+                    raise LLMDeadlineExceeded(f"{lane} stream stalled or exceeded its {self.stream_deadlines[lane]}s deadline")
+                worker, kind, value = event
+                if worker is not winner:
+                    continue
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            # Stops the backend streams at their next delta; each releases its slot once closed
+            for worker in workers:
+                worker.cancelled.set()
+            self._abandon(workers)
+
+    # --- asyncio API (FastAPI) ---
+
+    async def call_async(self, lane, coro_fn, *args, **kwargs):
+        """Await coro_fn under the lane's deadline, retrying transient errors"""
+        self._count("calls")
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadlines[lane]
+        attempt = 0
+
+        while True:
+            attempt += 1
+            async with AsyncExitStack() as held:
+                await self._hold_slot_async(held, lane, deadline_at)
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    raise self._queue_timeout(lane)
+
+                try:
+                    return await self._attempt_async(lane, remaining, coro_fn, args, kwargs)
+                except LLMDeadlineExceeded as e:
+                    self._count("deadline_exceeded")
+                    self._record_failure(e)
+                    raise
+                except Exception as e:
+                    delay = self._backoff(attempt)
+                    if not is_transient_error(e) or attempt >= self.max_attempts or loop.time() + delay >= deadline_at:
+                        self._record_failure(e)
+                        raise
+                    print(f"⚠️ Transient LLM error ({type(e).__name__}), retrying in {delay:.2f}s: {e}")
+                    self._count("retries")
+            # Back off without holding the slot
+            await asyncio.sleep(delay)
+
+    async def _run_async(self, lane, deadline_at, coro_fn, args, kwargs):
+        """A hedge takes its own slot; cancelling it while it is still queued just gives up the wait"""
+        async with self._slot(lane, deadline_at - asyncio.get_running_loop().time()):
+            return await coro_fn(*args, **kwargs)
+
+    async def _attempt_async(self, lane, remaining, coro_fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        deadline_at = loop.time() + remaining
+        primary = asyncio.ensure_future(coro_fn(*args, **kwargs))
+        pending = {primary}
+
+        try:
+            hedge_after = self.hedge_delay(lane)
+            if hedge_after is not None and hedge_after < remaining:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                if not done:
+                    self._count("hedges")
+                    pending.add(asyncio.ensure_future(self._run_async(lane, deadline_at, coro_fn, args, kwargs)))
+
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise LLMDeadlineExceeded(f"{lane} call exceeded its {self.deadlines[lane]}s deadline")
+                for task in done:
+                    if task.exception() is None:
+                        self._record_success(lane, time.monotonic() - started_at, task is not primary)
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # Unlike threads, losing or timed-out coroutines can be cancelled outright; wait for them
+            # so their slots are free again before this attempt's slot is
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def stream_async(self, lane, stream_fn, *args, **kwargs):
+        """
+        Iterate an async stream with deadlines for the first delta, for each gap between deltas and
+        for the whole stream, retrying transient errors that happen before the first delta. On
+        hedged lanes a second stream starts when the first delta is late, and the first to produce
+        one wins.
+        """
+        self._count("calls")
+        loop = asyncio.get_running_loop()
+        finish_at = loop.time() + self.stream_deadlines[lane]
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            first_delta_at = min(loop.time() + self.first_delta_deadlines[lane], finish_at)
+            async with AsyncExitStack() as held:
+                await self._hold_slot_async(held, lane, first_delta_at)
+                deltas = self._stream_attempt_async(lane, first_delta_at, finish_at, stream_fn, args, kwargs)
+                try:
+                    async for delta in deltas:
+                        started = True
+                        yield delta
+                    return
+                except LLMDeadlineExceeded as e:
+                    self._count("deadline_exceeded")
+                    self._record_failure(e)
+                    raise
+                except Exception as e:
+                    delay = self._backoff(attempt)
+                    if started or not is_transient_error(e) or attempt >= self.max_attempts:
+                        self._record_failure(e)
+                        raise
+                    print(f"⚠️ Transient LLM error ({type(e).__name__}), retrying stream in {delay:.2f}s: {e}")
+                    self._count("retries")
+                finally:
+                    await deltas.aclose()
+            await asyncio.sleep(delay)
+
+    async def _pump_async(self, events, slot, stream_fn, args, kwargs):
+        task = asyncio.current_task()
+        try:
+            async with slot:
+                iterator = stream_fn(*args, **kwargs)
+                try:
+                    async for delta in iterator:
+                        events.put_nowait((task, "delta", delta))
+                    events.put_nowait((task, "done", None))
+                except Exception as e:
+                    events.put_nowait((task, "error", e))
+                finally:
+                    aclose = getattr(iterator, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+        except TimeoutError as e:
+            # A hedge's slot wait timed out
+            events.put_nowait((task, "error", e))
+
+    @staticmethod
+    async def _next_event_async(events, until):
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(events.get(), timeout=max(0.0, until - loop.time()))
+        except asyncio.TimeoutError:
+            return None
+
+    async def _stream_attempt_async(self, lane, first_delta_at, finish_at, stream_fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        hedge_at = self._hedge_at(lane, started_at, first_delta_at)
+        events = asyncio.Queue()
+        # The primary runs in the slot stream_async holds; a hedge takes its own
+        primary = asyncio.ensure_future(self._pump_async(events, nullcontext(), stream_fn, args, kwargs))
+        tasks = [primary]
+        live = [primary]
+
+        try:
+            winner = None
+            while winner is None:
+                event = await self._next_event_async(events, hedge_at if hedge_at is not None else first_delta_at)
+                if event is None:
+                    if hedge_at is not None:
+                        hedge_at = None
+                        self._count("hedges")
+                        hedge_slot = self._slot(lane, first_delta_at - loop.time())
+                        hedge = asyncio.ensure_future(self._pump_async(events, hedge_slot, stream_fn, args, kwargs))
+                        tasks.append(hedge)
+                        live.append(hedge)
+                        continue
+                    raise LLMDeadlineExceeded(f"{lane} stream produced no output within its deadline")
+                task, kind, value = event
+                if kind == "error":
+                    live.remove(task)
+                    if not live:
+                        raise value
+                    continue
+                winner = task
+                self._record_success(lane, loop.time() - started_at, winner is not primary, first_delta=True)
+                for other in tasks:
+                    if other is not winner:
+                        other.cancel()
+                if kind == "done":
+                    return
+                yield value
+
+            while True:
+                event = await self._next_event_async(events, min(loop.time() + self.chunk_deadline, finish_at))
+                if event is None:
+                    raise LLMDeadlineExceeded(f"{lane} stream stalled or exceeded its {self.stream_deadlines[lane]}s deadline")
+                task, kind, value = event
+                if task is not winner:
+                    continue
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            abandoned_running = sum(1 for attempt in self._abandoned if not attempt.done())
+        return {
+            **counters,
+            "abandoned_running": abandoned_running,
+            "lanes": {
+                lane: {
+                    "deadline_seconds": self.deadlines[lane],
+                    "samples": len(tracker),
+                    "p50_ms": round((tracker.percentile(0.5) or 0) * 1000, 1),
+                    "p95_ms": round((tracker.percentile(0.95) or 0) * 1000, 1),
+                    "first_delta_p95_ms": round((self.first_delta_latencies[lane].percentile(0.95) or 0) * 1000, 1),
+                    "hedge_after_ms": round(self.hedge_delay(lane) * 1000, 1) if self.hedge_delay(lane) is not None else None
+                }
+                for lane, tracker in self.latencies.items()
+            }
+        }
+
+# Served while the circuit is open and no cached answer exists for the prompt
+FALLBACK_RESPONSES = {
+    "chat": "I'm sorry, our AI assistant is temporarily unavailable. Your message has been saved - "
+            "please try again in a minute or two.",
+    "report": "The AI report service is temporarily unavailable, so this report could not be generated. "
+              "Please try generating the report again in a few minutes.",
+    # No JSON object, so extraction falls back to its empty financial data structure
+    "extraction": "Financial data extraction is temporarily unavailable."
+}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures or a high share of slow/failed calls, fails fast while
+    open, and probes recovery in a background thread before closing again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold=5, slow_call_seconds=20.0, window_size=20,
+                 min_calls=10, bad_call_ratio=0.5, cooldown_seconds=30.0, probe=None,
+                 probe_timeout_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        # One threshold for every lane, or {lane: seconds}: a report may take far longer than a chat reply
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.bad_call_ratio = bad_call_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.probe = probe
+        self.probe_timeout_seconds = probe_timeout_seconds
+
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._window = deque(maxlen=window_size)
+        self._consecutive_failures = 0
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self._probe_call = None
+        self.counters = {"opened": 0, "fast_failed": 0, "probes": 0}
+
+    def set_probe(self, probe):
+        """
+        Callable that performs a cheap model call; raising means the dependency is still down, and
+        so does not returning within probe_timeout_seconds
+        """
+        self.probe = probe
+
+    def allow(self):
+        """False while open; callers should serve a fallback immediately"""
+        with self._lock:
+            if self.state == self.OPEN:
+                self.counters["fast_failed"] += 1
+                return False
+            return True
+
+    def is_slow(self, latency_seconds, lane="chat"):
+        threshold = self.slow_call_seconds
+        if isinstance(threshold, dict):
+            threshold = threshold.get(lane)
+        return threshold is not None and latency_seconds > threshold
+
+    def record_success(self, latency_seconds, lane="chat"):
+        """Record a call that returned; for streams, pass the time to the first delta"""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._window.append(self.is_slow(latency_seconds, lane))
+            self._maybe_open()
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._window.append(True)
+            self._maybe_open()
+
+    def _maybe_open(self):
+        if self.state == self.OPEN:
+            return
+        bad_calls = sum(self._window)
+        too_many_bad = len(self._window) >= self.min_calls and bad_calls / len(self._window) >= self.bad_call_ratio
+        if self._consecutive_failures >= self.failure_threshold or too_many_bad:
+            self.state = self.OPEN
+            self.opened_at = time.time()
+            self.counters["opened"] += 1
+            print(f"⚠️ LLM circuit breaker opened ({self._consecutive_failures} consecutive failures, {bad_calls}/{len(self._window)} bad calls)")
+            self._start_probe()
+
+    def _start_probe(self):
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name="llm-breaker-probe", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.cooldown_seconds)
+            with self._lock:
+                self.counters["probes"] += 1
+            try:
+                if self.probe is not None:
+                    self._run_probe()
+            except Exception as e:
+                print(f"⚠️ LLM recovery probe failed, circuit stays open: {e}")
+                continue
+
+            with self._lock:
+                self.state = self.CLOSED
+                self.opened_at = None
+                self._consecutive_failures = 0
+                self._window.clear()
+            print("✅ LLM circuit breaker closed - recovery probe succeeded")
+            return
+
+    def _run_probe(self):
+        """Call the probe on its own thread so a hung call counts as a failure instead of stalling recovery"""
+        if self._probe_call is not None and self._probe_call.is_alive():
+            raise TimeoutError("the previous recovery probe has still not returned")
+
+        outcome = {}
+
+        def call():
+            try:
+                self.probe()
+            except Exception as e:
+                outcome["error"] = e
+
+        self._probe_call = threading.Thread(target=call, name="llm-breaker-probe-call", daemon=True)
+        self._probe_call.start()
+        self._probe_call.join(self.probe_timeout_seconds)
+        if self._probe_call.is_alive():
+            raise TimeoutError(f"recovery probe did not return within {self.probe_timeout_seconds}s")
+        if "error" in outcome:
+            raise outcome["error"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "opened_at": self.opened_at,
+                "consecutive_failures": self._consecutive_failures,
+                "recent_bad_calls": sum(self._window),
+                "recent_calls": len(self._window),
+                **self.counters
+            }
+
+def _hedge_after_from_env():
+    value = os.getenv('LLM_HEDGE_AFTER_MS')
+    return float(value) / 1000.0 if value else None
+
+# Create global instance
+llm_caller = ResilientLLMCaller(
+    deadlines={
+        "chat": float(os.getenv('LLM_CHAT_DEADLINE_SECONDS', '30')),
+        "report": float(os.getenv('LLM_REPORT_DEADLINE_SECONDS', '120')),
+        "extraction": float(os.getenv('LLM_EXTRACTION_DEADLINE_SECONDS', '60'))
+    },
+    max_attempts=int(os.getenv('LLM_MAX_ATTEMPTS', '3')),
+    base_delay=float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5')),
+    max_delay=float(os.getenv('LLM_RETRY_MAX_DELAY', '8')),
+    hedge_lanes=("chat",) if os.getenv('LLM_HEDGE_CHAT', 'false').lower() == 'true' else (),
+    hedge_after=_hedge_after_from_env(),
+    max_workers=int(os.getenv('LLM_CALL_THREADS', '32')),
+    first_delta_deadlines={
+        "chat": float(os.getenv('LLM_CHAT_FIRST_DELTA_SECONDS', '15')),
+        "report": float(os.getenv('LLM_REPORT_FIRST_DELTA_SECONDS', '60')),
+        "extraction": float(os.getenv('LLM_EXTRACTION_FIRST_DELTA_SECONDS', '30'))
+    },
+    stream_deadlines={
+        "chat": float(os.getenv('LLM_CHAT_STREAM_DEADLINE_SECONDS', '120')),
+        "report": float(os.getenv('LLM_REPORT_DEADLINE_SECONDS', '120')),
+        "extraction": float(os.getenv('LLM_EXTRACTION_DEADLINE_SECONDS', '60'))
+    },
+    chunk_deadline=float(os.getenv('LLM_STREAM_CHUNK_DEADLINE_SECONDS', '15'))
+)
+
+llm_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('LLM_BREAKER_FAILURE_THRESHOLD', '5')),
+    slow_call_seconds={
+        "chat": float(os.getenv('LLM_BREAKER_SLOW_CALL_SECONDS', '20')),
+        "report": float(os.getenv('LLM_BREAKER_REPORT_SLOW_CALL_SECONDS', '90')),
+        "extraction": float(os.getenv('LLM_BREAKER_EXTRACTION_SLOW_CALL_SECONDS', '45'))
+    },
+    bad_call_ratio=float(os.getenv('LLM_BREAKER_BAD_CALL_RATIO', '0.5')),
+    cooldown_seconds=float(os.getenv('LLM_BREAKER_COOLDOWN_SECONDS', '30')),
+    probe_timeout_seconds=float(os.getenv('LLM_BREAKER_PROBE_TIMEOUT_SECONDS', '30'))
+)
+
+# The caller reports outcomes, since only it knows each attempt's model time apart from slot queueing
+llm_caller.set_breaker(llm_breaker)
@@ -0,0 +1,169 @@
+"""
+LLM Call Scheduler
+Priority lanes (chat > report > extraction) with a global concurrency cap
+and per-lane queue-time metrics
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+# Lower number = served first
+LANE_PRIORITIES = {
+    "chat": 0,
+    "report": 1,
+    "extraction": 2
+}
+
+class _LaneMetrics:
+    __slots__ = ("started", "queued", "timed_out", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.started = 0
+        self.queued = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait):
+        self.started += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+    def as_dict(self):
+        return {
+            "started": self.started,
+            "queued": self.queued,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait / self.started * 1000, 2) if self.started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2)
+        }
+
+class _BaseScheduler:
+    def __init__(self, max_concurrency=8):
+        self.max_concurrency = max(1, max_concurrency)
+        self._active = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._metrics = {lane: _LaneMetrics() for lane in LANE_PRIORITIES}
+
+    @staticmethod
+    def _priority(lane):
+        if lane not in LANE_PRIORITIES:
+            raise ValueError(f"Unknown LLM lane: {lane}")
+        return LANE_PRIORITIES[lane]
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "waiting": len(self._waiting),
+            "lanes": {lane: metrics.as_dict() for lane, metrics in self._metrics.items()}
+        }
+
+class LLMScheduler(_BaseScheduler):
+    """Thread-based scheduler for the Flask/Socket.IO app"""
+
+    def __init__(self, max_concurrency=8):
+        super().__init__(max_concurrency)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, lane="chat", timeout=None):
+        """
+        Block until a model-call slot is free for this lane, then hold it.
+        Raises TimeoutError when no slot frees up within timeout seconds.
+        """
+        ticket = (self._priority(lane), next(self._seq))
+        metrics = self._metrics[lane]
+        start = time.monotonic()
+        give_up_at = None if timeout is None else start + timeout
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            metrics.queued += 1
+            while self._waiting[0] != ticket or self._active >= self.max_concurrency:
+                remaining = None if give_up_at is None else give_up_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    metrics.queued -= 1
+                    metrics.timed_out += 1
+                    # The ticket behind ours may be next in line now
+                    self._cond.notify_all()
+                    raise TimeoutError(f"No {lane} model slot became free within {timeout}s")
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiting)
+            metrics.queued -= 1
+            self._active += 1
+            metrics.record(time.monotonic() - start)
+            # The next ticket in line may also fit under the cap
+            self._cond.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def run(self, lane, fn, *args, **kwargs):
+        """Call fn while holding a slot in the given lane"""
+        with self.slot(lane):
+            return fn(*args, **kwargs)
+
+    def stats(self):
+        with self._cond:
+            return super().stats()
+
+class AsyncLLMScheduler(_BaseScheduler):
+    """asyncio scheduler for the FastAPI app"""
+
+    @asynccontextmanager
+    async def slot(self, lane="chat", timeout=None):
+        """
+        Wait until a model-call slot is free for this lane, then hold it.
+        Raises TimeoutError when no slot frees up within timeout seconds.
+        """
+        priority = self._priority(lane)
+        metrics = self._metrics[lane]
+        start = time.monotonic()
+
+        if self._active < self.max_concurrency and not self._waiting:
+            self._active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (priority, next(self._seq), future))
+            metrics.queued += 1
+            try:
+                # _release() hands its slot straight to us, so _active is not touched here.
+                # On timeout wait_for cancels the future, and _release() skips cancelled ones
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                metrics.timed_out += 1
+                raise TimeoutError(f"No {lane} model slot became free within {timeout}s") from None
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before we were cancelled
+                    self._release()
+                raise
+            finally:
+                metrics.queued -= 1
+
+        metrics.record(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
@@ -0,0 +1,74 @@
+"""
+Local Embeddings
+CPU-only hashing embeddings for the conversation vector store, so semantic search keeps
+working without the Gemini embeddings API. Words and word bigrams are hashed into a fixed
+number of signed buckets with sublinear term frequency and L2 normalization.
+"""
+
+import os
+import re
+import math
+import hashlib
+
+from langchain_core.embeddings import Embeddings
+
+_WORD_RE = re.compile(r"[a-z0-9$%]+(?:[.,'][a-z0-9]+)*")
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dimensions=512, use_bigrams=True):
+        self.dimensions = dimensions
+        self.use_bigrams = use_bigrams
+        self.model_name = f"local-hashing-{dimensions}"
+
+    def _bucket(self, feature):
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        # The top bit picks the sign so colliding features tend to cancel instead of pile up
+        return value % self.dimensions, (1.0 if value >> 63 else -1.0)
+
+    def _features(self, text):
+        words = _WORD_RE.findall(text.lower())
+        features = list(words)
+        if self.use_bigrams:
+            features.extend(f"{first} {second}" for first, second in zip(words, words[1:]))
+        return features
+
+    def embed(self, text):
+        counts = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+
+        vector = [0.0] * self.dimensions
+        for feature, count in counts.items():
+            index, sign = self._bucket(feature)
+            vector[index] += sign * (1.0 + math.log(count))
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def embed_documents(self, texts):
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed(text)
+
+def create_embeddings(api_key=None):
+    """
+    Embeddings model named by EMBEDDING_BACKEND: "gemini", "local", or "auto" (the default),
+    which uses Gemini when an API key is configured and the local model otherwise.
+    Returns (embeddings, model_name).
+    """
+    backend = os.getenv('EMBEDDING_BACKEND', 'auto').lower()
+    if backend == 'auto':
+        backend = 'gemini' if api_key else 'local'
+
+    if backend == 'local':
+        embeddings = HashingEmbeddings(dimensions=int(os.getenv('LOCAL_EMBEDDING_DIMENSIONS', '512')))
+        return embeddings, embeddings.model_name
+
+    if backend != 'gemini':
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'")
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    model_name = "models/embedding-001"
+    return GoogleGenerativeAIEmbeddings(model=model_name, google_api_key=api_key), model_name
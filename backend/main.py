@@ -1,8 +1,9 @@
 import os
 import json
+import asyncio
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,9 +16,6 @@ SUPABASE_AVAILABLE = False
 create_client = None
 Client = None
 
-# Google Gemini Import
-import google.generativeai as genai
-
 # Load environment variables (with error handling)
 try:
     load_dotenv()
@@ -25,6 +23,13 @@ except Exception as e:
     print(f"Warning: Could not load .env file: {e}")
     print("Continuing without .env file...")
 
+# LLM helpers read their settings from the environment, so import them after .env is loaded
+from llm_cache import llm_cache
+from request_coalescing import AsyncSingleFlight
+from llm_scheduler import AsyncLLMScheduler
+from llm_backends import create_llm_backend
+from llm_resilience import llm_caller, llm_breaker, FALLBACK_RESPONSES
+
 app = FastAPI(title="Financial Assistant API", version="1.0.0")
 
 # CORS for frontend
@@ -37,9 +42,20 @@ app.add_middleware(
 )
 
 # Global variables
-gemini_model = None
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+llm_backend = None
 supabase = None
 
+# Upper bound on concurrent in-flight Gemini calls for this worker; waiting calls
+# are admitted by priority lane (chat > report > extraction)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+llm_scheduler = AsyncLLMScheduler(max_concurrency=GEMINI_MAX_CONCURRENCY)
+# Each attempt and hedge holds its own slot until its Gemini call returns
+llm_caller.set_scheduler(llm_scheduler)
+
+# Concurrent identical prompts share one in-flight Gemini call
+gemini_flight = AsyncSingleFlight()
+
 # --- PYDANTIC MODELS ---
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
@@ -61,6 +77,8 @@ class ClientData(BaseModel):
 class StreamedMessage(BaseModel):
     type: str = "message"
     message: ChatMessage
+    # Text added since the previous message line; message.content always holds the full text so far
+    delta: Optional[str] = None
 
 class StreamedLoading(BaseModel):
     type: str = "loading"
@@ -164,49 +182,106 @@ async def get_financial_report(report_id: str) -> Optional[Dict]:
         return None
 
 # --- HELPER FUNCTIONS ---
-async def get_gemini_response(messages: List[Dict[str, str]], system_prompt: str = None) -> str:
-    """Get response from Google Gemini API"""
+def build_gemini_prompt(messages: List[Dict[str, str]], system_prompt: str = None) -> str:
+    """Flatten the system prompt and chat history into a single Gemini prompt"""
+    conversation_text = ""
+    
+    if system_prompt:
+        conversation_text += f"System: {system_prompt}\n\n"
+    
+    # Add conversation history
+    for msg in messages:
+        role = "Human" if msg["role"] == "user" else "Assistant"
+        conversation_text += f"{role}: {msg['content']}\n\n"
+    
+    return conversation_text
+
+async def get_gemini_response(messages: List[Dict[str, str]], system_prompt: str = None, lane: str = "chat") -> str:
+    """Get response from Google Gemini API, scheduled in the given priority lane"""
     try:
-        if not gemini_model:
+        if not llm_backend:
             return "Gemini model not initialized. Please check your API key."
         
         # Prepare the conversation for Gemini
-        conversation_text = ""
+        conversation_text = build_gemini_prompt(messages, system_prompt)
         
-        if system_prompt:
-            conversation_text += f"System: {system_prompt}\n\n"
+        cached = llm_cache.get(conversation_text, llm_backend.model_name)
+        if cached is not None:
+            return cached
         
-        # Add conversation history
-        for msg in messages:
-            role = "Human" if msg["role"] == "user" else "Assistant"
-            conversation_text += f"{role}: {msg['content']}\n\n"
+        # Fail fast instead of queueing behind a degraded model
+        if not llm_breaker.allow():
+            return llm_fallback_response(conversation_text, lane)
         
-        # Generate response using Gemini
-        response = gemini_model.generate_content(conversation_text)
-        
-        return response.text
+        cache_key = llm_cache.make_key(conversation_text, llm_backend.model_name)
+        return await gemini_flight.do(cache_key, _generate_and_cache, conversation_text, lane)
     except Exception as e:
         print(f"Error calling Gemini: {e}")
         return f"I apologize, but I encountered an error processing your request: {str(e)}"
 
+async def _generate_and_cache(conversation_text: str, lane: str) -> str:
+    """Call Gemini and store the response in the LLM cache"""
+    # Use the async client so the event loop keeps serving other requests meanwhile
+    # Lane slot, per-lane deadline, jittered retries on transient errors, optional hedging for chat,
+    # and circuit breaker accounting
+    response = await llm_caller.call_async(lane, llm_backend.generate_async, conversation_text)
+    
+    llm_cache.set(conversation_text, llm_backend.model_name, response)
+    return response
+
+def llm_fallback_response(conversation_text: str, lane: str) -> str:
+    """Serve a stale cached answer, or the canned response for the lane, while the LLM circuit is open"""
+    stale = llm_cache.get(conversation_text, llm_backend.model_name, allow_expired=True)
+    return stale if stale is not None else FALLBACK_RESPONSES[lane]
+
+async def stream_gemini_response(messages: List[Dict[str, str]], system_prompt: str = None) -> AsyncIterator[str]:
+    """Yield text deltas from Google Gemini as they are generated"""
+    if not llm_backend:
+        yield "Gemini model not initialized. Please check your API key."
+        return
+    
+    conversation_text = build_gemini_prompt(messages, system_prompt)
+    
+    cached = llm_cache.get(conversation_text, llm_backend.model_name)
+    if cached is not None:
+        yield cached
+        return
+    
+    if not llm_breaker.allow():
+        yield llm_fallback_response(conversation_text, "chat")
+        return
+    
+    text = ""
+    # Lane slot, first-delta and inter-chunk deadlines, optional hedging for chat, and circuit
+    # breaker accounting timed to the first delta
+    async for delta in llm_caller.stream_async("chat", llm_backend.stream_async, conversation_text):
+        text += delta
+        yield delta
+    
+    llm_cache.set(conversation_text, llm_backend.model_name, text)
+
 # --- APPLICATION LIFESPAN ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global gemini_model, supabase
+    global llm_backend, supabase
     
-    # Initialize Google Gemini
+    # Initialize the LLM backend (LLM_BACKEND=gemini by default, or "stub" for offline load testing)
     google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        print("⚠️ GOOGLE_API_KEY not found in environment variables")
-        gemini_model = None
-    else:
-        try:
-            genai.configure(api_key=google_api_key)
-            gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-            print("✅ Google Gemini client initialized")
-        except Exception as e:
-            print(f"⚠️ Error initializing Gemini: {e}")
-            gemini_model = None
+    try:
+        llm_backend = create_llm_backend(api_key=google_api_key, model_name=GEMINI_MODEL_NAME)
+        if llm_backend:
+            print(f"✅ LLM backend initialized: {llm_backend.model_name}")
+            # While the breaker is open, a background thread probes with this cheap call until it succeeds.
+            # It runs on the event loop through the caller, so it takes a chat slot and has the chat deadline
+            loop = asyncio.get_running_loop()
+            llm_breaker.set_probe(lambda: asyncio.run_coroutine_threadsafe(
+                llm_caller.call_async("chat", llm_backend.generate_async, "Reply with OK."), loop
+            ).result())
+        else:
+            print("⚠️ GOOGLE_API_KEY not found in environment variables")
+    except Exception as e:
+        print(f"⚠️ Error initializing LLM backend: {e}")
+        llm_backend = None
     
     # Initialize Supabase (optional - can work without it)
     global SUPABASE_AVAILABLE, create_client, Client
@@ -295,23 +370,6 @@ async def create_database_tables():
     except Exception as e:
         print(f"⚠️ Database table creation error: {e}")
 
-# --- STREAMING UTILITIES ---
-async def stream_response(content: str, citations: List[Dict] = None):
-    """Stream response in the format expected by the frontend"""
-    citations = citations or []
-    
-    # Stream loading indicator
-    loading_data = StreamedLoading(indicator={"status": "Generating response", "icon": "thinking"})
-    yield f"{json.dumps(loading_data.dict())}\n"
-    
-    # Stream the actual message
-    message_data = StreamedMessage(message=ChatMessage(role="assistant", content=content, citations=citations))
-    yield f"{json.dumps(message_data.dict())}\n"
-    
-    # Stream done indicator
-    done_data = StreamedDone()
-    yield f"{json.dumps(done_data.dict())}\n"
-
 # --- API ENDPOINTS ---
 app.lifespan = lifespan
 
@@ -319,10 +377,24 @@ app.lifespan = lifespan
 def read_root():
     return {"message": "Financial Assistant API Ready", "version": "1.0.0"}
 
+@app.get("/api/llm-cache/stats")
+def llm_cache_stats():
+    """Get hit/miss counters for the LLM response cache"""
+    return {"cache": llm_cache.stats(), "coalescing": gemini_flight.stats()}
+
+@app.get("/api/llm-scheduler/stats")
+def llm_scheduler_stats():
+    """Get concurrency and queue-time metrics for the LLM call scheduler"""
+    return {
+        "scheduler": llm_scheduler.stats(),
+        "calls": llm_caller.stats(),
+        "circuit_breaker": llm_breaker.stats()
+    }
+
 @app.post("/api/chat")
 async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks):
     """Main chat endpoint that matches the frontend expectations"""
-    if not gemini_model:
+    if not llm_backend:
         raise HTTPException(status_code=500, detail="Gemini model not initialized")
     
     try:
@@ -376,18 +448,24 @@ RESPONSE STYLE:
 
 When users request financial plans or reports, gather all necessary information and create comprehensive, professional recommendations."""
 
-                # Get Gemini response
-                response_content = await get_gemini_response(chat_history, system_prompt)
+                # Stream Gemini deltas as they arrive; each message line carries the
+                # accumulated content so the frontend can keep replacing the last bubble
+                citations = []  # No citations needed for direct Gemini responses
+                response_content = ""
+                async for delta in stream_gemini_response(chat_history, system_prompt):
+                    response_content += delta
+                    message_data = StreamedMessage(
+                        message=ChatMessage(role="assistant", content=response_content, citations=citations),
+                        delta=delta
+                    )
+                    yield f"{json.dumps(message_data.dict())}\n"
+                
+                yield f"{json.dumps(StreamedDone().dict())}\n"
                 
                 # Extract client data in background if detected
                 if any(keyword in user_input.lower() for keyword in ["client", "customer", "age", "income", "risk tolerance", "goals"]):
                     background_tasks.add_task(extract_and_save_client_data, user_input, conversation_id)
                 
-                # Stream the response
-                citations = []  # No citations needed for direct OpenAI responses
-                async for chunk in stream_response(response_content, citations):
-                    yield chunk
-                
                 # Save conversation in background if database is available
                 if SUPABASE_AVAILABLE and supabase:
                     all_messages = messages + [ChatMessage(role="assistant", content=response_content, citations=citations)]
@@ -435,7 +513,7 @@ async def get_client(client_name: str):
 @app.post("/api/generate-report")
 async def generate_financial_report(request: ReportRequest):
     """Generate a comprehensive financial report for a client"""
-    if not gemini_model:
+    if not llm_backend:
         raise HTTPException(status_code=500, detail="Gemini model not initialized")
     
     try:
@@ -471,7 +549,7 @@ async def generate_financial_report(request: ReportRequest):
         
         # Generate the report using Gemini directly
         messages = [{"role": "user", "content": report_prompt}]
-        response_content = await get_gemini_response(messages)
+        response_content = await get_gemini_response(messages, lane="report")
         
         # Create report object
         report_id = str(uuid.uuid4())
@@ -531,7 +609,7 @@ async def extract_and_save_client_data(message: str, conversation_id: str):
         
         # You could use Gemini to extract structured data:
         # extraction_prompt = "Extract client information from this message: {message}"
-        # extracted_data = await get_gemini_response([{"role": "user", "content": extraction_prompt}])
+        # extracted_data = await get_gemini_response([{"role": "user", "content": extraction_prompt}], lane="extraction")
         
         # For demonstration, we'll just log it
         print(f"Client data extraction completed for conversation: {conversation_id}")
@@ -0,0 +1,189 @@
+"""
+Bounded Conversation Store
+Capacity- and idle-time-bounded in-process maps for per-conversation state.
+Cold conversations are spilled to SQLite and rehydrated transparently on next access.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+class SpillStore:
+    """SQLite backing for evicted per-conversation state, partitioned by namespace"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS spilled_state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._db.commit()
+
+    def put(self, namespace, key, value):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO spilled_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, time.time())
+            )
+            self._db.commit()
+
+    def take(self, namespace, key):
+        """Remove and return a spilled value, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM spilled_state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM spilled_state WHERE namespace = ? AND key = ?", (namespace, key))
+            self._db.commit()
+            return row[0]
+
+    def delete(self, namespace, key):
+        """Delete a spilled value; returns whether one existed"""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM spilled_state WHERE namespace = ? AND key = ?", (namespace, key))
+            self._db.commit()
+            return cursor.rowcount > 0
+
+    def count(self, namespace):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM spilled_state WHERE namespace = ?", (namespace,)
+            ).fetchone()[0]
+
+class BoundedConversationStore:
+    """
+    Dict-like map of conversation_id -> state that keeps at most max_entries hot entries
+    and evicts any entry idle for longer than max_idle_seconds
+    """
+
+    def __init__(self, namespace, backing=None, max_entries=1000, max_idle_seconds=3600,
+                 serialize=json.dumps, deserialize=json.loads):
+        self.namespace = namespace
+        self.backing = backing
+        self.max_entries = max_entries
+        self.max_idle_seconds = max_idle_seconds
+        self.serialize = serialize
+        self.deserialize = deserialize
+
+        # conversation_id -> (value, last_access); least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def _touch(self, key, value):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+
+    def _evict_cold(self):
+        now = time.monotonic()
+        while self._entries:
+            key, (value, last_access) = next(iter(self._entries.items()))
+            over_capacity = len(self._entries) > self.max_entries
+            idle = self.max_idle_seconds > 0 and now - last_access > self.max_idle_seconds
+            if not (over_capacity or idle):
+                break
+            del self._entries[key]
+            self.evictions += 1
+            if self.backing is not None:
+                try:
+                    self.backing.put(self.namespace, key, self.serialize(value))
+                except Exception as e:
+                    print(f"⚠️ Error spilling {self.namespace} state for {key}: {e}")
+
+    def _load(self, key):
+        """Return the hot value for key, rehydrating it from the backing if it was evicted"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._touch(key, entry[0])
+            return entry[0]
+
+        if self.backing is None:
+            return None
+        try:
+            raw = self.backing.take(self.namespace, key)
+        except Exception as e:
+            print(f"⚠️ Error rehydrating {self.namespace} state for {key}: {e}")
+            return None
+        if raw is None:
+            return None
+
+        value = self.deserialize(raw)
+        self.rehydrations += 1
+        self._touch(key, value)
+        self._evict_cold()
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._load(key)
+            return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._touch(key, value)
+            self._evict_cold()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __delitem__(self, key):
+        with self._lock:
+            found = self._entries.pop(key, None) is not None
+            if self.backing is not None:
+                found = self.backing.delete(self.namespace, key) or found
+            if not found:
+                raise KeyError(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value = self._load(key)
+            if value is None:
+                return default
+            del self._entries[key]
+            return value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            self._evict_cold()
+            return {
+                "hot": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_idle_seconds": self.max_idle_seconds,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+                "spilled": self.backing.count(self.namespace) if self.backing is not None else 0
+            }
+
+def create_spill_store():
+    """SQLite spill store at CONVERSATION_SPILL_DB, or None to drop evicted state"""
+    db_path = os.getenv('CONVERSATION_SPILL_DB', './conversation_state.db')
+    if not db_path:
+        return None
+    try:
+        return SpillStore(db_path)
+    except Exception as e:
+        print(f"⚠️ Conversation spill store not available: {e}")
+        return None
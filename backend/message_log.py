@@ -0,0 +1,109 @@
+"""
+Message Log
+Compact, append-only per-conversation message records. Roles are interned to small
+integer codes, timestamps are epoch milliseconds in an int array, and all message
+content lives in one contiguous UTF-8 buffer addressed by offsets.
+"""
+
+import sys
+import threading
+from array import array
+from datetime import datetime
+
+# Role strings are interned once and stored per message as a one-byte code
+_ROLES = ["user", "assistant", "system"]
+_ROLE_CODES = {role: code for code, role in enumerate(_ROLES)}
+_ROLES_LOCK = threading.Lock()
+
+def _role_code(role):
+    code = _ROLE_CODES.get(role)
+    if code is None:
+        with _ROLES_LOCK:
+            code = _ROLE_CODES.get(role)
+            if code is None:
+                if len(_ROLES) >= 256:
+                    raise ValueError(f"Too many distinct message roles to intern '{role}'")
+                code = len(_ROLES)
+                _ROLES.append(sys.intern(role))
+                _ROLE_CODES[_ROLES[code]] = code
+    return code
+
+def _to_millis(timestamp):
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if timestamp:
+        try:
+            return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+        except ValueError:
+            pass
+    return int(datetime.now().timestamp() * 1000)
+
+class MessageLog:
+    """One conversation's messages; materializes the familiar message dicts on read"""
+
+    __slots__ = ("_roles", "_timestamps", "_offsets", "_content", "_extras")
+
+    def __init__(self):
+        self._roles = array('B')
+        self._timestamps = array('q')
+        # _offsets[i]:_offsets[i + 1] is message i's slice of _content
+        self._offsets = array('Q', [0])
+        self._content = bytearray()
+        # message index -> extra fields (client_name, type, ...) for the few messages that have them
+        self._extras = {}
+
+    def append(self, message):
+        """Append a message dict with role, content, optional timestamp and any extra fields"""
+        index = len(self._timestamps)
+        self._content += (message.get('content') or '').encode('utf-8')
+        self._offsets.append(len(self._content))
+        self._roles.append(_role_code(message.get('role', 'assistant')))
+
+        extras = {
+            key: sys.intern(value) if isinstance(value, str) and len(value) < 64 else value
+            for key, value in message.items() if key not in ('role', 'content', 'timestamp')
+        }
+        if extras:
+            self._extras[index] = extras
+        # The timestamp goes last: its length is what readers treat as the message count
+        self._timestamps.append(_to_millis(message.get('timestamp')))
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def role(self, index):
+        return _ROLES[self._roles[index]]
+
+    def content(self, index):
+        return self._content[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+
+    def message(self, index):
+        message = {
+            'role': self.role(index),
+            'content': self.content(index),
+            'timestamp': datetime.fromtimestamp(self._timestamps[index] / 1000).isoformat()
+        }
+        extras = self._extras.get(index)
+        if extras:
+            message.update(extras)
+        return message
+
+    def messages(self, limit=None):
+        """The last `limit` messages as dicts, oldest first (every message when limit is None)"""
+        count = len(self)
+        start = max(count - limit, 0) if limit else 0
+        return [self.message(index) for index in range(start, count)]
+
+    def slice(self, start, stop=None):
+        """Messages at absolute positions start:stop as dicts, unaffected by later appends"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        return [self.message(index) for index in range(max(start, 0), stop)]
+
+    def nbytes(self):
+        """Approximate memory held by the record arrays and content buffer"""
+        return (
+            self._roles.itemsize * len(self._roles)
+            + self._timestamps.itemsize * len(self._timestamps)
+            + self._offsets.itemsize * len(self._offsets)
+            + len(self._content)
+        )
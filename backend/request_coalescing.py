@@ -0,0 +1,98 @@
+"""
+Request Coalescing
+Single-flight helpers so concurrent identical LLM calls share one in-flight request
+"""
+
+import asyncio
+import threading
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Thread-based single-flight group for the Flask/Socket.IO app"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once per key; callers arriving while it runs wait and share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls)
+            }
+
+class AsyncSingleFlight:
+    """asyncio single-flight group for the FastAPI app"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        """Await coro_fn once per key; concurrent callers await the same future"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield() keeps one cancelled waiter from cancelling the shared call
+            return await asyncio.shield(future)
+
+        self.executed += 1
+        future = asyncio.ensure_future(coro_fn(*args, **kwargs))
+        self._calls[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def stats(self):
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
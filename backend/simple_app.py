@@ -1,18 +1,17 @@
 import os
 import json
+import time
 import uuid
+import hashlib
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 # LangChain imports
-from langchain.memory import ConversationBufferMemory, ConversationSummaryMemory
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain.schema import HumanMessage, AIMessage
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import ConversationChain
 from langchain.prompts import PromptTemplate
@@ -37,27 +36,59 @@ try:
 except Exception as e:
     print(f"⚠️ Could not load .env file: {e}")
 
+# LLM helpers read their settings from the environment, so import them after .env is loaded
+from llm_cache import llm_cache
+from request_coalescing import SingleFlight
+from llm_scheduler import LLMScheduler
+from llm_backends import create_llm_backend
+from context_builder import build_context, estimate_tokens
+from financial_data import empty_financial_info, merge_financial_info, extract_financial_mentions, FINANCIAL_UPDATE_SCHEMA
+from json_extract import extract_json_from_stream
+from llm_resilience import llm_caller, llm_breaker, FALLBACK_RESPONSES
+from memory_store import BoundedConversationStore, create_spill_store
+from vector_ingest import create_vector_ingest_queue
+from embedding_cache import create_cached_embeddings
+from local_embeddings import create_embeddings
+from vector_maintenance import compact_collection
+from vector_partitions import PartitionedVectorStore
+from hybrid_search import BM25Index, SearchResultCache, fuse_results, encode_cursor, decode_cursor
+from conversation_store import (
+    conversation_store, ConversationHistory, ConversationSummaries, ConversationPreferences, ReportStore
+)
+
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000", "http://localhost:3001", "http://127.0.0.1:3000", "http://127.0.0.1:3001"])
 
 # Initialize SocketIO for real-time communication
 socketio = SocketIO(app, cors_allowed_origins=["http://localhost:3000", "http://localhost:3001", "http://127.0.0.1:3000", "http://127.0.0.1:3001"])  # Enable CORS for frontend ports
 
-# Initialize Gemini
-gemini_model = None
+# Initialize the LLM backend (LLM_BACKEND=gemini by default, or "stub" for offline load testing)
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+llm_backend = None
 google_api_key = os.getenv("GOOGLE_API_KEY")
+if google_api_key == "your_actual_gemini_api_key_here":
+    google_api_key = None
 
-if google_api_key and google_api_key != "your_actual_gemini_api_key_here":
-    try:
-        genai.configure(api_key=google_api_key)
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-        print("✅ Google Gemini initialized successfully")
-    except Exception as e:
-        print(f"⚠️ Error initializing Gemini: {e}")
-        gemini_model = None
-else:
-    print("⚠️ GOOGLE_API_KEY not found or not set properly")
-    print(f"Current key: {google_api_key[:10] + '...' if google_api_key else 'None'}")
+# Every Gemini call takes a slot here so report and extraction bursts cannot starve live chats
+llm_scheduler = LLMScheduler(max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")))
+# Each attempt and hedge holds its own slot until its Gemini call returns, even after a deadline
+llm_caller.set_scheduler(llm_scheduler)
+
+try:
+    llm_backend = create_llm_backend(api_key=google_api_key, model_name=GEMINI_MODEL_NAME)
+    if llm_backend:
+        print(f"✅ LLM backend initialized successfully: {llm_backend.model_name}")
+    else:
+        print("⚠️ GOOGLE_API_KEY not found or not set properly")
+        print(f"Current key: {google_api_key[:10] + '...' if google_api_key else 'None'}")
+except Exception as e:
+    print(f"⚠️ Error initializing LLM backend: {e}")
+    llm_backend = None
+
+if llm_backend:
+    # While the breaker is open, a background thread probes with this cheap call until it succeeds.
+    # It goes through the caller so it waits for a chat slot and gives up at the chat deadline
+    llm_breaker.set_probe(lambda: llm_caller.call("chat", llm_backend.generate, "Reply with OK."))
 
 # Initialize Supabase
 supabase = None
@@ -77,11 +108,62 @@ if SUPABASE_AVAILABLE:
 else:
     print("⚠️ Supabase not available - using in-memory storage only")
 
-# In-memory storage for reports (simple solution)
-reports = {}
+# Reports persisted in the local SQLite conversation store
+reports = ReportStore(conversation_store)
+
+# Concurrent identical Gemini calls, extractions and report runs share one in-flight execution
+llm_flight = SingleFlight()
+
+# Token budgets for conversation context embedded in report and extraction prompts
+REPORT_CONTEXT_TOKENS = int(os.getenv('REPORT_CONTEXT_TOKENS', '1500'))
+EXTRACTION_CONTEXT_TOKENS = int(os.getenv('EXTRACTION_CONTEXT_TOKENS', '3000'))
+CONTEXT_SUMMARY_BACKFILL = os.getenv('CONTEXT_SUMMARY_BACKFILL', 'true').lower() != 'false'
+
+# Bounds for per-conversation state kept hot in this process; colder conversations spill to SQLite
+MEMORY_MAX_CONVERSATIONS = int(os.getenv('MEMORY_MAX_CONVERSATIONS', '500'))
+MEMORY_MAX_IDLE_SECONDS = int(os.getenv('MEMORY_MAX_IDLE_SECONDS', '1800'))
+
+# Read plainly stated balances with rules and only ask the model when the rules are unsure
+FINANCIAL_FAST_PATH = os.getenv('FINANCIAL_FAST_PATH', 'true').lower() != 'false'
+
+# Hybrid search: weight of vector relevance against BM25, and candidates fetched per stage per result
+HYBRID_VECTOR_WEIGHT = float(os.getenv('HYBRID_VECTOR_WEIGHT', '0.5'))
+HYBRID_CANDIDATES_PER_RESULT = int(os.getenv('HYBRID_CANDIDATES_PER_RESULT', '4'))
+
+# Search paging: results below SEARCH_MIN_SCORE are dropped; rankings reach SEARCH_PAGES_AHEAD pages past the
+# requested one, at most SEARCH_MAX_RESULTS deep, and are cached briefly
+SEARCH_MIN_SCORE = float(os.getenv('SEARCH_MIN_SCORE', '0.1'))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv('SEARCH_MAX_PAGE_SIZE', '20'))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '100'))
+SEARCH_PAGES_AHEAD = int(os.getenv('SEARCH_PAGES_AHEAD', '1'))
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv('SEARCH_CACHE_TTL_SECONDS', '60'))
+
+# Vector store maintenance: chunk retention (0 keeps everything) and how often the job runs (0 disables the timer)
+CHROMA_PERSIST_DIRECTORY = os.getenv('CHROMA_PERSIST_DIRECTORY', './chroma_db')
+VECTOR_RETENTION_DAYS = int(os.getenv('VECTOR_RETENTION_DAYS', '0'))
+VECTOR_MAINTENANCE_INTERVAL_HOURS = float(os.getenv('VECTOR_MAINTENANCE_INTERVAL_HOURS', '0'))
+# Copy chunks indexed before per-conversation partitions existed into their partitions at startup
+VECTOR_PARTITION_BACKFILL = os.getenv('VECTOR_PARTITION_BACKFILL', 'true').lower() != 'false'
+
+# Rolling summaries: "llm" folds each turn into the summary with the model, "local" keeps abbreviated recent turns
+SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'llm').lower()
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '400'))
+# Most turns folded in when the stored summary is behind the log (turns queued when the process stopped)
+SUMMARY_CATCH_UP_TURNS = int(os.getenv('SUMMARY_CATCH_UP_TURNS', '20'))
+
+SUMMARY_FOLD_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new summary.
+Keep every concrete financial detail the client mentioned (amounts, accounts, debts, income, goals, risk tolerance and report preferences). Stay under {max_words} words.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
 
 # Store conversation preferences for report customization
-conversation_preferences = {}
+conversation_preferences = ConversationPreferences(conversation_store)
 
 # Store report format templates
 report_templates = {
@@ -123,138 +205,361 @@ report_templates = {
     }
 }
 
-# Store conversation history for each session
-conversation_history = {}
+# Canonical compact message log for each conversation (written through to SQLite, loaded lazily)
+conversation_history = ConversationHistory(
+    conversation_store,
+    max_cached=MEMORY_MAX_CONVERSATIONS,
+    max_idle_seconds=MEMORY_MAX_IDLE_SECONDS
+)
 
 # Store active WebSocket connections
 active_connections = {}
 
+def conversation_collection_name(embedding_model):
+    """The Gemini collection keeps its original name; other embedding models get their own"""
+    if embedding_model == "models/embedding-001":
+        return "conversation_history"
+    return "conversation_history_" + "".join(c if c.isalnum() else "_" for c in embedding_model)
+
 # LangChain Memory System
 class ConversationMemoryManager:
-    def __init__(self):
-        # Initialize embeddings for vector storage using Google Gemini
+    def __init__(self, history):
+        # Every chat path reads and writes the same message log
+        self.history = history
+        
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        # Keyword index over the same chunks as the vector store, updated as each turn completes
+        self.keyword_index = BM25Index()
+        self.search_cache = SearchResultCache(ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+        
+        # Initialize embeddings for vector storage (Google Gemini, or the local hashing model offline)
         try:
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001",
-                google_api_key=os.getenv('GOOGLE_API_KEY')
-            )
-            self.vectorstore = Chroma(
-                collection_name="conversation_history",
-                embedding_function=self.embeddings,
-                persist_directory="./chroma_db"
-            )
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
+            embeddings, embedding_model = create_embeddings(os.getenv('GOOGLE_API_KEY'))
+            # Identical chunks (canned replies, repeated questions) are embedded once and reused
+            self.embeddings = create_cached_embeddings(embeddings, embedding_model)
+            self.embedding_model = embedding_model
+            # Per-conversation partitions for scoped search, plus the global collection for everything else.
+            # Vectors from different models are not comparable, so each model gets its own collections
+            collection_name = conversation_collection_name(embedding_model)
+            self.vectorstore = PartitionedVectorStore(
+                self.embeddings,
+                CHROMA_PERSIST_DIRECTORY,
+                global_collection_name=collection_name,
+                partition_prefix=collection_name
             )
-            print("✅ LangChain vector storage initialized with Google Gemini embeddings")
+            # Embedding and add_texts happen in batches off the request path
+            self.vector_ingest = create_vector_ingest_queue(self.vectorstore)
+            print(f"✅ LangChain vector storage initialized with {embedding_model} embeddings")
         except Exception as e:
             print(f"⚠️ LangChain vector storage not available: {e}")
             self.vectorstore = None
             self.embeddings = None
-        
-        # In-memory conversation storage
-        self.conversation_memories = {}
-        self.conversation_summaries = {}
+            self.embedding_model = None
+            self.vector_ingest = None
+        
+        # Rolling summaries, written through to the conversation store on every fold
+        self.conversation_summaries = ConversationSummaries(
+            history.store, MEMORY_MAX_CONVERSATIONS, MEMORY_MAX_IDLE_SECONDS
+        )
+        # Extracted financial_info per conversation plus the message count it covers
+        self.financial_snapshots = BoundedConversationStore(
+            "financial", create_spill_store(), MEMORY_MAX_CONVERSATIONS, MEMORY_MAX_IDLE_SECONDS
+        )
+        
+        # Rolling summaries are folded off the request path, one conversation at a time
+        self.summarizer = None
+        self._summary_pending = {}
+        self._summary_running = set()
+        self._summary_lock = threading.Lock()
+        self._summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+        
+        self._maintenance_lock = threading.Lock()
+        if self.vectorstore:
+            # Rebuild the keyword index from chunks persisted by earlier runs without holding up startup
+            threading.Thread(target=self._load_keyword_index, name="keyword-index", daemon=True).start()
+            if VECTOR_MAINTENANCE_INTERVAL_HOURS > 0:
+                threading.Thread(target=self._maintenance_loop, name="vector-maintenance", daemon=True).start()
+    
+    def _maintenance_loop(self):
+        while True:
+            time.sleep(VECTOR_MAINTENANCE_INTERVAL_HOURS * 3600)
+            try:
+                report = self.run_vector_maintenance()
+                print(f"🧹 Vector store maintenance: {report['deleted']}, {report['before']['bytes_on_disk']} -> {report['after']['bytes_on_disk']} bytes")
+            except Exception as e:
+                print(f"⚠️ Error running vector store maintenance: {e}")
     
-    def get_or_create_memory(self, conversation_id):
-        """Get or create a conversation memory for a specific conversation"""
-        if conversation_id not in self.conversation_memories:
-            self.conversation_memories[conversation_id] = ConversationBufferMemory(
-                return_messages=True,
-                memory_key="chat_history"
+    def run_vector_maintenance(self, retention_days=None):
+        """Apply retention, drop duplicate chunks and compact the collection; returns a before/after report"""
+        if not self.vectorstore:
+            raise RuntimeError("Vector store not available")
+        with self._maintenance_lock, self.vector_ingest.paused():
+            report = compact_collection(
+                self.vectorstore,
+                self.embeddings,
+                CHROMA_PERSIST_DIRECTORY,
+                retention_days=VECTOR_RETENTION_DAYS if retention_days is None else retention_days,
+                conversation_exists=self.history.store.conversation_exists
             )
-        return self.conversation_memories[conversation_id]
+        # Keep keyword search and cached rankings consistent with what was deleted
+        for conversation_id, text in report.pop("removed_chunks"):
+            self.keyword_index.remove(conversation_id, text)
+        self.search_cache.clear()
+        return report
+    
+    def _load_keyword_index(self):
+        conversation_exists = self.history.store.conversation_exists
+        try:
+            stored = self.vectorstore.get(include=["documents", "metadatas"])
+            # Chunks of deleted conversations may linger in the collection until maintenance sweeps them
+            known = {}
+            for text, metadata in zip(stored.get("documents") or [], stored.get("metadatas") or []):
+                conversation_id = (metadata or {}).get("conversation_id")
+                if self.vectorstore.is_deleted(metadata):
+                    continue
+                if conversation_id:
+                    if conversation_id not in known:
+                        known[conversation_id] = conversation_exists(conversation_id)
+                    if not known[conversation_id]:
+                        continue
+                self.keyword_index.add(text, metadata or {})
+            print(f"✅ Keyword index loaded: {self.keyword_index.stats()['chunks']} chunks")
+        except Exception as e:
+            print(f"⚠️ Error loading keyword index from vector store: {e}")
+        
+        if VECTOR_PARTITION_BACKFILL:
+            try:
+                copied = self.vectorstore.backfill_partitions(conversation_exists=conversation_exists)
+                if copied:
+                    print(f"✅ Backfilled {copied} chunks into per-conversation vector partitions")
+            except Exception as e:
+                print(f"⚠️ Error backfilling vector partitions: {e}")
     
-    def add_message(self, conversation_id, role, message):
-        """Add a single message to the conversation memory"""
+    def stats(self):
+        """Hot/spilled counts for the bounded per-conversation stores"""
+        return {
+            "history": self.history.stats(),
+            "summaries": self.conversation_summaries.stats(),
+            "financial_snapshots": self.financial_snapshots.stats(),
+            "vector_ingest": self.vector_ingest.stats() if self.vector_ingest else None,
+            "embedding_cache": self.embeddings.stats() if hasattr(self.embeddings, "stats") else None,
+            "keyword_index": self.keyword_index.stats(),
+            "vector_partitions": self.vectorstore.stats() if self.vectorstore else None,
+            "search_cache": self.search_cache.stats()
+        }
+    
+    def add_message(self, conversation_id, role, message, **extra):
+        """Append a message to the conversation log; a completed turn is also summarized and indexed"""
         print(f"💾 Adding message to memory - conversation_id: {conversation_id}, role: {role}, message: {message[:50]}...")
-        memory = self.get_or_create_memory(conversation_id)
-        
-        if role == "user":
-            # For user messages, we need to store them temporarily until we get the AI response
-            if not hasattr(self, 'pending_user_messages'):
-                self.pending_user_messages = {}
-            self.pending_user_messages[conversation_id] = message
-            print(f"💾 Stored user message temporarily for conversation {conversation_id}")
-        elif role == "assistant":
-            # For assistant messages, we can now save the context with the pending user message
-            if hasattr(self, 'pending_user_messages') and conversation_id in self.pending_user_messages:
-                user_message = self.pending_user_messages[conversation_id]
-                memory.save_context(
-                    {"input": user_message},
-                    {"output": message}
-                )
-                print(f"💾 Saved conversation context for {conversation_id}: user='{user_message[:30]}...', assistant='{message[:30]}...'")
-                del self.pending_user_messages[conversation_id]
-            else:
-                print(f"⚠️ No pending user message found for conversation {conversation_id}")
+        log, index = self.history.append(conversation_id, {
+            'role': role,
+            'content': message,
+            'timestamp': datetime.now().isoformat(),
+            **extra
+        })
         
-        # Also store in vector database if available
+        # Typed assistant messages (report notices) are not replies to the user
+        if role != "assistant" or extra.get('type'):
+            return
+        # The reply pairs with the user message it answers, even when other messages landed in between
+        user_index = self.history.take_pending_turn(conversation_id)
+        if user_index is None:
+            print(f"⚠️ No pending user message found for conversation {conversation_id}; turn not summarized or indexed")
+            return
+        user_message = log.content(user_index)
+        print(f"💾 Saved conversation context for {conversation_id}: user='{user_message[:30]}...', assistant='{message[:30]}...'")
+        self._queue_summary_update(conversation_id, user_message, message, index + 1)
+        self._index_turn(conversation_id, user_message, message)
+    
+    def delete_conversation(self, conversation_id):
+        """Delete a conversation's messages, summary and search entries; returns whether it existed"""
+        existed = self.history.delete(conversation_id)
+        for store in (self.conversation_summaries, self.financial_snapshots):
+            try:
+                del store[conversation_id]
+            except KeyError:
+                pass
+        self.keyword_index.remove_conversation(conversation_id)
+        if self.vectorstore:
+            # Drops the partition and tombstones the global copies until maintenance purges them
+            existed = self.vectorstore.delete_conversation(conversation_id) or existed
+        self.search_cache.clear()
+        return existed
+    
+    def _index_turn(self, conversation_id, user_message, ai_message):
+        """Add a completed turn to the keyword index now and queue it for the vector store"""
+        try:
+            chunks = self.text_splitter.split_text(f"Human: {user_message}\nAI: {ai_message}")
+            metadata = {
+                "conversation_id": conversation_id,
+                "timestamp": datetime.now().isoformat(),
+                "type": "conversation"
+            }
+            for chunk in chunks:
+                self.keyword_index.add(chunk, metadata)
+            if self.vector_ingest:
+                self.vector_ingest.enqueue(chunks, metadata)
+        except Exception as e:
+            print(f"⚠️ Error indexing turn for search: {e}")
+    
+    def get_conversation_history(self, conversation_id, limit=10):
+        """Get recent conversation history as message dicts (limit=None returns every message)"""
+        return self.history.tail(conversation_id, limit)
+    
+    def search_conversations(self, query, conversation_id=None, limit=5):
+        """
+        Hybrid keyword + semantic search through conversation history.
+        Returns (results, timings) where results are ranked dicts with fused and per-stage scores.
+        """
+        timings = {}
+        candidates = max(limit * HYBRID_CANDIDATES_PER_RESULT, limit)
+        
+        started = time.perf_counter()
+        keyword_results = self.keyword_index.search(query, conversation_id, candidates)
+        timings["bm25_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        
+        vector_results = []
+        started = time.perf_counter()
         if self.vectorstore:
             try:
-                # Create a combined message for vector storage
-                combined_text = f"Human: {human_message}\nAI: {ai_message}"
-                chunks = self.text_splitter.split_text(combined_text)
-                
-                # Add metadata
-                metadatas = [{
-                    "conversation_id": conversation_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "type": "conversation"
-                }] * len(chunks)
+                # Filter by conversation_id if provided
+                filter_dict = {"conversation_id": conversation_id} if conversation_id else None
                 
-                self.vectorstore.add_texts(
-                    texts=chunks,
-                    metadatas=metadatas
+                scored = self.vectorstore.similarity_search_with_relevance_scores(
+                    query=query,
+                    k=candidates,
+                    filter=filter_dict
                 )
+                vector_results = [(score, doc.page_content, doc.metadata) for doc, score in scored]
             except Exception as e:
-                print(f"⚠️ Error adding to vector store: {e}")
+                print(f"⚠️ Error searching conversations: {e}")
+        timings["vector_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        
+        started = time.perf_counter()
+        results = fuse_results(keyword_results, vector_results, HYBRID_VECTOR_WEIGHT)[:limit]
+        timings["fusion_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        timings["total_ms"] = round(timings["bm25_ms"] + timings["vector_ms"] + timings["fusion_ms"], 3)
+        return results, timings
     
-    def get_conversation_history(self, conversation_id, limit=10):
-        """Get recent conversation history"""
-        memory = self.get_or_create_memory(conversation_id)
-        return memory.chat_memory.messages[-limit:] if memory.chat_memory.messages else []
+    def search_conversations_page(self, query, conversation_id=None, limit=5, min_score=0.0, cursor=None):
+        """
+        One page of thresholded search results. The ranking is computed SEARCH_PAGES_AHEAD pages past
+        the requested one (at most SEARCH_MAX_RESULTS deep) and cached briefly, so following
+        next_cursor usually serves the next page from the cache and only deeper pages rank again.
+        Returns (page, next_cursor, total, timings, cached); total counts the results ranked so far.
+        """
+        offset = 0
+        if cursor:
+            query, conversation_id, min_score, offset = decode_cursor(cursor)
+        depth = min(SEARCH_MAX_RESULTS, (offset + limit) * (1 + SEARCH_PAGES_AHEAD))
+        
+        key = self.search_cache.make_key(query, conversation_id, min_score)
+        entry = self.search_cache.get(key)
+        cached = entry is not None and (entry["exhausted"] or entry["depth"] >= offset + limit)
+        timings = {}
+        if not cached:
+            results, timings = self.search_conversations(query, conversation_id, depth)
+            ranked = [result for result in results if result["score"] >= min_score]
+            entry = {
+                "ranked": ranked,
+                "depth": depth,
+                # Fewer results than asked for, or a cut by min_score (results come best first), means
+                # ranking deeper would find nothing more for this query
+                "exhausted": len(results) < depth or len(ranked) < len(results) or depth >= SEARCH_MAX_RESULTS
+            }
+            self.search_cache.set(key, entry)
+        ranked = entry["ranked"]
+        
+        page = ranked[offset:offset + limit]
+        next_offset = offset + len(page)
+        more = next_offset < len(ranked) or not entry["exhausted"]
+        next_cursor = encode_cursor(query, conversation_id, min_score, next_offset) if more else None
+        return page, next_cursor, len(ranked), timings, cached
     
-    def search_conversations(self, query, conversation_id=None, limit=5):
-        """Search through conversation history using semantic search"""
-        if not self.vectorstore:
-            return []
-        
-        try:
-            # Filter by conversation_id if provided
-            filter_dict = {"conversation_id": conversation_id} if conversation_id else None
+    def get_conversation_summary(self, conversation_id):
+        """Get the rolling summary of the conversation"""
+        record = self.get_summary_record(conversation_id)
+        return record["text"] if record["text"] else "No conversation history yet."
+    
+    def get_summary_record(self, conversation_id):
+        """Rolling summary text and its version (the message count it covers)"""
+        return self.conversation_summaries.get(conversation_id) or {"text": "", "version": 0}
+    
+    def _queue_summary_update(self, conversation_id, user_message, ai_message, version):
+        with self._summary_lock:
+            self._summary_pending.setdefault(conversation_id, []).append((user_message, ai_message, version))
+            if conversation_id in self._summary_running:
+                # The running fold picks this turn up before it exits
+                return
+            self._summary_running.add(conversation_id)
+        self._summary_executor.submit(self._run_summary_updates, conversation_id)
+    
+    def _run_summary_updates(self, conversation_id):
+        while True:
+            with self._summary_lock:
+                turns = self._summary_pending.pop(conversation_id, None)
+                if not turns:
+                    self._summary_running.discard(conversation_id)
+                    return
             
-            results = self.vectorstore.similarity_search(
-                query=query,
-                k=limit,
-                filter=filter_dict
-            )
-            return results
-        except Exception as e:
-            print(f"⚠️ Error searching conversations: {e}")
+            record = self.get_summary_record(conversation_id)
+            turns = self._missed_turns(conversation_id, record["version"], turns[0][2]) + turns
+            try:
+                text = self._fold_summary(record["text"], turns)
+            except Exception as e:
+                print(f"⚠️ Error folding conversation summary, keeping recent turns instead: {e}")
+                text = self._fold_summary_locally(record["text"], turns)
+            self.conversation_summaries[conversation_id] = {
+                "text": text,
+                "version": turns[-1][2],
+                "updated_at": datetime.now().isoformat()
+            }
+    
+    def _missed_turns(self, conversation_id, version, next_version):
+        """
+        Completed turns the summary at `version` does not cover that come before the turn ending at
+        next_version, such as turns still queued when the process stopped. Only the most recent
+        SUMMARY_CATCH_UP_TURNS are returned.
+        """
+        # A turn ending at version v is the user message v - 2 and the assistant reply v - 1
+        if next_version - 2 - version < 2:
             return []
+        log = self.history.log(conversation_id)
+        turns = []
+        for index in range(max(version + 1, 1), min(next_version - 2, len(log))):
+            if log.role(index) != "assistant" or log.role(index - 1) != "user" or log.message(index).get('type'):
+                continue
+            turns.append((log.content(index - 1), log.content(index), index + 1))
+        return turns[-SUMMARY_CATCH_UP_TURNS:]
     
-    def get_conversation_summary(self, conversation_id):
-        """Get or create a summary of the conversation"""
-        if conversation_id not in self.conversation_summaries:
-            messages = self.get_conversation_history(conversation_id)
-            if messages:
-                # Create a simple summary from recent messages
-                recent_messages = messages[-6:]  # Last 6 messages
-                summary_parts = []
-                for msg in recent_messages:
-                    if hasattr(msg, 'content'):
-                        summary_parts.append(f"{type(msg).__name__}: {msg.content[:100]}...")
-                
-                self.conversation_summaries[conversation_id] = "\n".join(summary_parts)
-            else:
-                self.conversation_summaries[conversation_id] = "No conversation history yet."
-        
-        return self.conversation_summaries[conversation_id]
+    def _fold_summary(self, summary, turns):
+        """Fold new turns into the previous summary instead of re-summarizing the whole conversation"""
+        if SUMMARY_MODE != "llm" or self.summarizer is None:
+            return self._fold_summary_locally(summary, turns)
+        
+        new_lines = "\n".join(f"Human: {user}\nAI: {ai}" for user, ai, _ in turns)
+        prompt = SUMMARY_FOLD_PROMPT.format(
+            max_words=int(SUMMARY_MAX_TOKENS * 0.75),
+            summary=summary or "(none yet)",
+            new_lines=new_lines
+        )
+        return self.summarizer(prompt).strip()
+    
+    def _fold_summary_locally(self, summary, turns):
+        """Append abbreviated turns and drop the oldest lines once over the token budget"""
+        lines = summary.split("\n") if summary else []
+        for user, ai, _ in turns:
+            lines.append(f"User: {user[:100]}...")
+            lines.append(f"Assistant: {ai[:100]}...")
+        while len(lines) > 2 and estimate_tokens("\n".join(lines)) > SUMMARY_MAX_TOKENS:
+            lines.pop(0)
+        return "\n".join(lines)
 
 # Initialize the memory manager
-memory_manager = ConversationMemoryManager()
+memory_manager = ConversationMemoryManager(conversation_history)
 
 # =============================================
 # AUTHENTICATION HELPER FUNCTIONS
@@ -378,67 +683,72 @@ def verify_client_session(session_token):
         return None
 
 def generate_financial_data_from_conversation(conversation_id, client_name):
-    """Generate financial data based on conversation history instead of hardcoded values"""
+    """
+    Generate financial data based on conversation history instead of hardcoded values.
+    Raises if the conversation could not be read, rather than passing off empty data as current.
+    """
+    return llm_flight.do(
+        ("financial_data", conversation_id, client_name),
+        _generate_financial_data_from_conversation, conversation_id, client_name
+    )
+
+def _generate_financial_data_from_conversation(conversation_id, client_name):
     try:
         print(f"🔍 Generating financial data for conversation: {conversation_id}, client: {client_name}")
         
-        # Get conversation history
-        history = memory_manager.get_conversation_history(conversation_id)
-        print(f"📚 Retrieved conversation history: {len(history) if history else 0} messages")
-        if history:
-            print(f"📚 First message type: {type(history[0])}")
-            print(f"📚 First message content: {history[0]}")
-        else:
-            print("📚 No conversation history found in memory manager")
-        
-        # Extract financial information from conversation
-        financial_info = {
-            "assets": {"rrsp": 0, "tfsa": 0, "investments": 0, "realEstate": 0, "totalAssets": 0},
-            "liabilities": {"mortgage": 0, "carLoan": 0, "creditCards": 0, "totalLiabilities": 0},
-            "netWorth": 0,
-            "goals": {"shortTerm": [], "mediumTerm": [], "longTerm": []}
-        }
-        
-        # If no conversation history, return empty data
-        if not history:
-            print("⚠️ No conversation history found, returning empty financial data")
-            return financial_info
-        
-        # Analyze conversation for financial mentions
-        conversation_text = ""
-        for msg in history:
-            if hasattr(msg, 'content'):
-                conversation_text += msg.content + " "
-            elif hasattr(msg, 'text'):
-                conversation_text += msg.text + " "
-            else:
-                # Handle different message types
-                conversation_text += str(msg) + " "
+        # Only messages after the snapshot's watermark still need to be extracted
+        snapshot = memory_manager.financial_snapshots.get(conversation_id) or {"info": empty_financial_info(), "watermark": 0}
+        log = conversation_history.log(conversation_id)
+        message_count = len(log)
+        # By position, so a message appended meanwhile is neither read now nor skipped by the new watermark
+        new_messages = log.slice(snapshot["watermark"], message_count)
+        print(f"📚 Conversation has {message_count} messages, {len(new_messages)} new since the last extraction")
+        
+        # If nothing new was said, the snapshot is current
+        if not new_messages:
+            return snapshot["info"]
+        
+        if FINANCIAL_FAST_PATH:
+            update, confident = extract_financial_mentions(new_messages)
+            if confident:
+                print("⚡ Financial data read by rules, skipping model extraction")
+                financial_info = merge_financial_info(snapshot["info"], update)
+                memory_manager.financial_snapshots[conversation_id] = {"info": financial_info, "watermark": message_count}
+                return financial_info
+        
+        # Analyze the new messages for financial mentions, newest turns first within the token budget
+        conversation_text = build_context(
+            new_messages,
+            EXTRACTION_CONTEXT_TOKENS,
+            # A first extraction of a long conversation may not fit; later deltas are covered by the snapshot
+            summary=memory_manager.get_summary_record(conversation_id)["text"] or None
+            if CONTEXT_SUMMARY_BACKFILL and snapshot["watermark"] == 0 else None
+        )
         
         print(f"🔍 Conversation text extracted: {conversation_text[:200]}...")
         
-        # Use AI to extract financial data from conversation
+        # Use AI to extract financial data from the new part of the conversation
         extraction_prompt = f"""
-        Analyze the following conversation between a financial advisor and {client_name} and extract any mentioned financial information.
+        Analyze the following new messages from a conversation between a financial advisor and {client_name} and extract any financial information mentioned in them.
         
-        Conversation: {conversation_text}
+        Financial information already known from earlier in the conversation:
+        {json.dumps(snapshot["info"])}
         
-        Please extract and return ONLY the financial data mentioned in the conversation in this JSON format:
+        New messages: {conversation_text}
+        
+        Please extract and return ONLY the financial data mentioned in the new messages in this JSON format:
         {{
             "assets": {{
-                "rrsp": 0,
-                "tfsa": 0, 
-                "investments": 0,
-                "realEstate": 0,
-                "totalAssets": 0
+                "rrsp": null,
+                "tfsa": null,
+                "investments": null,
+                "realEstate": null
             }},
             "liabilities": {{
-                "mortgage": 0,
-                "carLoan": 0,
-                "creditCards": 0,
-                "totalLiabilities": 0
+                "mortgage": null,
+                "carLoan": null,
+                "creditCards": null
             }},
-            "netWorth": 0,
             "goals": {{
                 "shortTerm": [],
                 "mediumTerm": [],
@@ -447,34 +757,26 @@ def generate_financial_data_from_conversation(conversation_id, client_name):
         }}
         
         Rules:
-        - Only include financial data that was explicitly mentioned in the conversation
-        - If no specific amounts were mentioned, use 0
-        - For goals, only include goals that were specifically discussed
+        - Only include financial data that was explicitly mentioned in the new messages
+        - Use null for any amount the new messages do not mention; use 0 only if the client said it is now zero
+        - For goals, only include goals that were newly discussed
         - Return ONLY the JSON, no other text
         """
         
         try:
-            extracted_data = get_gemini_response(extraction_prompt)
-            # Try to parse the JSON response
-            import re
-            json_match = re.search(r'\{.*\}', extracted_data, re.DOTALL)
-            if json_match:
-                financial_info = json.loads(json_match.group())
+            update = extract_json_with_llm(extraction_prompt, FINANCIAL_UPDATE_SCHEMA)
         except Exception as e:
             print(f"⚠️ Error extracting financial data: {e}")
-            # Return empty data if extraction fails
+            # Keep the snapshot and its watermark so the same messages are retried next time
+            return snapshot["info"]
         
+        financial_info = merge_financial_info(snapshot["info"], update)
+        memory_manager.financial_snapshots[conversation_id] = {"info": financial_info, "watermark": message_count}
         return financial_info
         
     except Exception as e:
         print(f"⚠️ Error generating financial data: {e}")
-        # Return empty financial data structure
-        return {
-            "assets": {"rrsp": 0, "tfsa": 0, "investments": 0, "realEstate": 0, "totalAssets": 0},
-            "liabilities": {"mortgage": 0, "carLoan": 0, "creditCards": 0, "totalLiabilities": 0},
-            "netWorth": 0,
-            "goals": {"shortTerm": [], "mediumTerm": [], "longTerm": []}
-        }
+        raise
 
 def detect_report_template(user_preference):
     """Detect which report template to use based on user preference"""
@@ -497,14 +799,20 @@ def generate_custom_report_prompt(client_name, template_name, user_preference=""
     # Get conversation context
     conversation_context = ""
     if conversation_id:
-        history = memory_manager.get_conversation_history(conversation_id)
+        history = memory_manager.get_conversation_history(conversation_id, limit=None)
         if history:
-            conversation_text = " ".join([msg.content for msg in history if hasattr(msg, 'content')])
+            # Newest turns first within the token budget, so recent details survive long conversations
+            conversation_text = build_context(
+                history,
+                REPORT_CONTEXT_TOKENS,
+                # An empty summary is left out rather than sent as the "no history" placeholder
+                summary=memory_manager.get_summary_record(conversation_id)["text"] or None if CONTEXT_SUMMARY_BACKFILL else None
+            )
             conversation_context = f"""
     
     **Conversation Context:**
     Based on the following conversation with {client_name}:
-    {conversation_text[:2000]}...
+    {conversation_text}
     """
     
     # Build the report structure based on template
@@ -626,9 +934,9 @@ def get_messages_from_db(client_id):
         print(f"Error fetching messages: {e}")
         return {"success": False, "error": str(e)}
 
-def get_gemini_response(message, system_prompt=None):
-    """Get response from Google Gemini API"""
-    if not gemini_model:
+def get_gemini_response(message, system_prompt=None, lane="chat"):
+    """Get response from Google Gemini API, scheduled in the given priority lane"""
+    if not llm_backend:
         return "I apologize, but I'm not properly configured. Please check the API key setup."
     
     try:
@@ -636,22 +944,134 @@ def get_gemini_response(message, system_prompt=None):
             full_prompt = f"{system_prompt}\n\nUser: {message}"
         else:
             full_prompt = message
-            
-        response = gemini_model.generate_content(full_prompt)
-        return response.text
+        
+        cached = llm_cache.get(full_prompt, llm_backend.model_name)
+        if cached is not None:
+            return cached
+        
+        # Fail fast instead of queueing behind a degraded model
+        if not llm_breaker.allow():
+            return llm_fallback_response(full_prompt, lane)
+        
+        cache_key = llm_cache.make_key(full_prompt, llm_backend.model_name)
+        return llm_flight.do(("gemini", cache_key), _generate_and_cache, full_prompt, lane)
     except Exception as e:
         print(f"Error calling Gemini: {e}")
         return f"I encountered an error processing your request: {str(e)}"
 
+def _generate_and_cache(full_prompt, lane):
+    """Call Gemini and store the response in the LLM cache"""
+    # Lane slot, per-lane deadline, jittered retries on transient errors, optional hedging for chat,
+    # and circuit breaker accounting
+    response = llm_caller.call(lane, llm_backend.generate, full_prompt)
+    llm_cache.set(full_prompt, llm_backend.model_name, response)
+    return response
+
+def summarize_with_llm(prompt):
+    """Summary folds run in the extraction lane and raise on failure, so a bad call never replaces the summary"""
+    if not llm_backend or not llm_breaker.allow():
+        raise RuntimeError("LLM unavailable for summarization")
+    return _generate_and_cache(prompt, "extraction")
+
+memory_manager.summarizer = summarize_with_llm
+
+def llm_fallback_response(full_prompt, lane):
+    """Serve a stale cached answer, or the canned response for the lane, while the LLM circuit is open"""
+    stale = llm_cache.get(full_prompt, llm_backend.model_name, allow_expired=True)
+    return stale if stale is not None else FALLBACK_RESPONSES[lane]
+
+def extract_json_with_llm(prompt, schema, lane="extraction"):
+    """
+    Stream the prompt and return the first schema-valid JSON object as soon as it closes. The stream
+    runs under the lane's first-delta, inter-chunk and overall deadlines, and concurrent callers with
+    the same prompt share one model call.
+    """
+    if not llm_backend:
+        raise RuntimeError("LLM unavailable for extraction")
+    cache_key = llm_cache.make_key(prompt, llm_backend.model_name)
+    return llm_flight.do(("json", cache_key), _stream_and_extract_json, prompt, schema, lane)
+
+def _stream_and_extract_json(prompt, schema, lane):
+    # Parse as the response streams in and stop generating once the object is complete
+    result = extract_json_from_stream(stream_gemini_response(prompt, lane=lane), schema)
+    # Cache just the object, so a retry of the same prompt is answered without the model
+    llm_cache.set(prompt, llm_backend.model_name, json.dumps(result))
+    return result
+
+def stream_gemini_response(message, system_prompt=None, lane="chat"):
+    """Yield text deltas from Google Gemini API as they are generated"""
+    if not llm_backend:
+        yield "I apologize, but I'm not properly configured. Please check the API key setup."
+        return
+    
+    if system_prompt:
+        full_prompt = f"{system_prompt}\n\nUser: {message}"
+    else:
+        full_prompt = message
+    
+    cached = llm_cache.get(full_prompt, llm_backend.model_name)
+    if cached is not None:
+        yield cached
+        return
+    
+    if not llm_breaker.allow():
+        yield llm_fallback_response(full_prompt, lane)
+        return
+    
+    text = ""
+    # Lane slot, first-delta and inter-chunk deadlines, optional hedging for chat, and circuit
+    # breaker accounting timed to the first delta. A consumer that stops early (a parser that
+    # already has its object, or a gone client) leaves the loop here, so partial text is not cached.
+    for delta in llm_caller.stream(lane, llm_backend.stream, full_prompt):
+        text += delta
+        yield delta
+    
+    llm_cache.set(full_prompt, llm_backend.model_name, text)
+
 @app.route('/')
 def home():
     return jsonify({
         "message": "Financial Assistant API Ready",
         "version": "1.0.0",
-        "gemini_status": "ready" if gemini_model else "not_configured",
+        "gemini_status": "ready" if llm_backend else "not_configured",
+        "llm_backend": llm_backend.model_name if llm_backend else None,
         "supabase_status": "ready" if supabase else "not_configured"
     })
 
+@app.route('/api/llm-cache/stats', methods=['GET'])
+def llm_cache_stats():
+    """Get hit/miss counters for the LLM response cache"""
+    return jsonify({"success": True, "cache": llm_cache.stats(), "coalescing": llm_flight.stats()})
+
+@app.route('/api/llm-scheduler/stats', methods=['GET'])
+def llm_scheduler_stats():
+    """Get concurrency and queue-time metrics for the LLM call scheduler"""
+    return jsonify({
+        "success": True,
+        "scheduler": llm_scheduler.stats(),
+        "calls": llm_caller.stats(),
+        "circuit_breaker": llm_breaker.stats()
+    })
+
+@app.route('/api/vector-store/maintenance', methods=['POST'])
+def vector_store_maintenance():
+    """Apply retention, de-duplicate and compact the conversation vector store"""
+    try:
+        data = request.get_json(silent=True) or {}
+        retention_days = data.get('retention_days')
+        report = memory_manager.run_vector_maintenance(
+            retention_days=int(retention_days) if retention_days is not None else None
+        )
+        return jsonify({"success": True, "report": report})
+    except Exception as e:
+        print(f"❌ Error running vector store maintenance: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/memory/stats', methods=['GET'])
+def memory_stats():
+    """Get hot/spilled counts for per-conversation memory state"""
+    return jsonify({"success": True, "memory": memory_manager.stats()})
+
 @app.route('/static/<path:filename>')
 def serve_static(filename):
     """Serve static files from frontend"""
@@ -759,7 +1179,7 @@ def chat():
         
         print(f"💬 Processing message: {message[:50]}...")
         
-        # Store user message in LangChain memory manager
+        # Store user message in the conversation log
         memory_manager.add_message(conversation_id, "user", message)
         
         # Save user message to database if client_id is provided
@@ -822,7 +1242,7 @@ Is there anything specific you'd like me to help you with regarding your financi
             
             response = get_gemini_response(message, system_prompt)
         
-        # Store assistant response in LangChain memory manager
+        # Store assistant response in the conversation log
         memory_manager.add_message(conversation_id, "assistant", response)
         
         # Save assistant response to database if client_id is provided
@@ -851,6 +1271,43 @@ Is there anything specific you'd like me to help you with regarding your financi
         print(f"❌ Error in chat endpoint: {e}")
         return jsonify({"error": str(e)}), 500
 
+def create_report(client_name, conversation_id):
+    """Run the report pipeline and store the report; a double-clicked Generate Report shares one run"""
+    return llm_flight.do(("report", conversation_id, client_name), _create_report, client_name, conversation_id)
+
+def _create_report(client_name, conversation_id):
+    # Generate financial data based on conversation history
+    try:
+        financial_data = generate_financial_data_from_conversation(conversation_id, client_name)
+    except Exception:
+        # The report itself is still worth writing from the conversation
+        financial_data = empty_financial_info()
+    
+    # Check for user preferences in this conversation
+    user_preference = conversation_preferences.get(conversation_id, "")
+    
+    # Detect which template to use based on user preference
+    template_name = detect_report_template(user_preference)
+    print(f"📋 Using template: {template_name} for conversation {conversation_id}")
+    
+    # Generate a comprehensive financial report using template system
+    report_prompt = generate_custom_report_prompt(client_name, template_name, user_preference, conversation_id)
+    
+    report_content = get_gemini_response(report_prompt, lane="report")
+    
+    # Create report ID and store it
+    report_id = str(uuid.uuid4())
+    reports[report_id] = {
+        "id": report_id,
+        "client_name": client_name,
+        "content": report_content,
+        "financial_data": financial_data,
+        "created_at": datetime.now().isoformat(),
+        "conversation_id": conversation_id,
+        "user_preference": user_preference
+    }
+    return reports[report_id]
+
 @app.route('/api/generate-report', methods=['POST'])
 def generate_report():
     try:
@@ -858,33 +1315,7 @@ def generate_report():
         client_name = data.get('client_name', 'Unknown Client')
         conversation_id = data.get('conversation_id', str(uuid.uuid4()))
         
-        # Generate financial data based on conversation history
-        financial_data = generate_financial_data_from_conversation(conversation_id, client_name)
-        
-        # Check for user preferences in this conversation
-        user_preference = conversation_preferences.get(conversation_id, "")
-        
-        # Detect which template to use based on user preference
-        template_name = detect_report_template(user_preference)
-        print(f"📋 Using template: {template_name} for conversation {conversation_id}")
-        
-        # Generate a comprehensive financial report using template system
-        report_prompt = generate_custom_report_prompt(client_name, template_name, user_preference, conversation_id)
-
-        
-        report_content = get_gemini_response(report_prompt)
-        
-        # Create report ID and store it
-        report_id = str(uuid.uuid4())
-        reports[report_id] = {
-            "id": report_id,
-            "client_name": client_name,
-            "content": report_content,
-            "financial_data": financial_data,
-            "created_at": datetime.now().isoformat(),
-            "conversation_id": conversation_id,
-            "user_preference": user_preference
-        }
+        report_id = create_report(client_name, conversation_id)["id"]
         
         # Generate URL for accessing the report (HTML view)
         report_url = f"http://localhost:8000/reports/{report_id}"
@@ -899,23 +1330,49 @@ def generate_report():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def financial_data_etag(conversation_id, client_name, version):
+    """ETag for a financial-data response: changes when the conversation gains messages"""
+    digest = hashlib.sha1(f"{conversation_id}\x00{client_name}\x00{version}".encode('utf-8')).hexdigest()[:16]
+    return f"fd-{version}-{digest}"
+
 @app.route('/api/financial-data/<conversation_id>', methods=['GET'])
 def get_financial_data(conversation_id):
     """Get financial data extracted from conversation for charts and tables"""
     try:
         client_name = request.args.get('client_name', 'Unknown Client')
         
+        # The extracted snapshot is versioned by the message count it covers; while no new
+        # turn has arrived, a poll carrying the current ETag is answered without any work
+        message_count = conversation_history.count(conversation_id)
+        snapshot = memory_manager.financial_snapshots.get(conversation_id)
+        if message_count == 0 or (snapshot and snapshot["watermark"] == message_count):
+            etag = financial_data_etag(conversation_id, client_name, message_count)
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+                response.set_etag(etag)
+                # A 304 repeats the caching headers the 200 would carry
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+        
         # Generate financial data based on conversation history
         financial_data = generate_financial_data_from_conversation(conversation_id, client_name)
+        snapshot = memory_manager.financial_snapshots.get(conversation_id)
+        version = snapshot["watermark"] if snapshot else 0
         
-        return jsonify({
+        response = jsonify({
             "success": True,
             "financial_data": financial_data,
             "conversation_id": conversation_id,
-            "client_name": client_name
+            "client_name": client_name,
+            "version": version
         })
+        response.set_etag(financial_data_etag(conversation_id, client_name, version))
+        # Clients may keep the body but must revalidate it on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
+        # No ETag: an error must not be revalidated as if it were the snapshot
         print(f"❌ Error getting financial data: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -926,45 +1383,64 @@ def search_conversations():
         data = request.get_json()
         query = data.get('query', '').strip()
         conversation_id = data.get('conversation_id')
-        limit = data.get('limit', 5)
+        cursor = data.get('cursor')
+        try:
+            limit = min(max(int(data.get('limit', 5)), 1), SEARCH_MAX_PAGE_SIZE)
+            min_score = float(data.get('min_score', SEARCH_MIN_SCORE))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'limit and min_score must be numbers'}), 400
         
-        if not query:
+        if not query and not cursor:
             return jsonify({'error': 'Query cannot be empty'}), 400
         
-        # Search using LangChain vector store
-        results = memory_manager.search_conversations(query, conversation_id, limit)
-        
-        # Format results
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                'content': result.page_content,
-                'metadata': result.metadata,
-                'score': getattr(result, 'score', None)
-            })
+        # Search the keyword index and the LangChain vector store, fused into one ranking
+        try:
+            if cursor:
+                # The cursor carries the query, so echo that rather than the empty request field
+                query = decode_cursor(cursor)[0]
+            results, next_cursor, total, timings, cached = memory_manager.search_conversations_page(
+                query, conversation_id, limit, min_score, cursor
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'results': formatted_results,
+            'results': results,
             'query': query,
-            'total_found': len(formatted_results)
+            'total_found': total,
+            'next_cursor': next_cursor,
+            'cached': cached,
+            'timings': timings
         })
         
     except Exception as e:
         print(f"❌ Error searching conversations: {e}")
         return jsonify({'error': 'Error searching conversations'}), 500
 
+@app.route('/api/conversations/<conversation_id>', methods=['DELETE'])
+def delete_conversation(conversation_id):
+    """Delete a conversation's history, summary and search index entries"""
+    try:
+        if not memory_manager.delete_conversation(conversation_id):
+            return jsonify({"success": False, "error": "Conversation not found"}), 404
+        return jsonify({"success": True, "conversation_id": conversation_id})
+    except Exception as e:
+        print(f"❌ Error deleting conversation: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/conversation-summary/<conversation_id>')
 def get_conversation_summary(conversation_id):
     """Get a summary of a conversation"""
     try:
-        summary = memory_manager.get_conversation_summary(conversation_id)
-        history = memory_manager.get_conversation_history(conversation_id)
+        # Summaries are folded as each turn arrives, so this is a constant-time read
+        record = memory_manager.get_summary_record(conversation_id)
         
         return jsonify({
             'conversation_id': conversation_id,
-            'summary': summary,
-            'message_count': len(history),
-            'last_updated': datetime.now().isoformat()
+            'summary': record["text"] or "No conversation history yet.",
+            'summary_version': record["version"],
+            'message_count': conversation_history.count(conversation_id),
+            'last_updated': record.get("updated_at", datetime.now().isoformat())
         })
         
     except Exception as e:
@@ -1098,10 +1574,10 @@ def logout():
 @app.route('/api/reports/<report_id>')
 def get_report(report_id):
     try:
-        if report_id not in reports:
+        report = reports.get(report_id)
+        if report is None:
             return jsonify({"error": "Report not found"}), 404
         
-        report = reports[report_id]
         return jsonify({
             "success": True,
             "report": report
@@ -1113,7 +1589,8 @@ def get_report(report_id):
 @app.route('/reports/<report_id>')
 def view_report(report_id):
     try:
-        if report_id not in reports:
+        report = reports.get(report_id)
+        if report is None:
             return f"""
             <!DOCTYPE html>
             <html>
@@ -1131,7 +1608,6 @@ def view_report(report_id):
             </html>
             """, 404
         
-        report = reports[report_id]
         print(f"🔍 view_report: Retrieved report for {report_id}")
         print(f"🔍 view_report: Report keys: {list(report.keys())}")
         print(f"🔍 view_report: Financial data type: {type(report.get('financial_data', 'Not found'))}")
@@ -1770,12 +2246,12 @@ def format_report_sections(content):
 def list_reports():
     try:
         report_list = []
-        for report_id, report in reports.items():
+        for report in reports.list():
             report_list.append({
-                "id": report_id,
+                "id": report["id"],
                 "client_name": report["client_name"],
                 "created_at": report["created_at"],
-                "url": f"http://localhost:8000/reports/{report_id}"
+                "url": f"http://localhost:8000/reports/{report['id']}"
             })
         
         return jsonify({
@@ -1827,7 +2303,7 @@ def handle_join_conversation(data):
         })
     else:
         # Initialize empty conversation
-        conversation_history[conversation_id] = []
+        conversation_history.start(conversation_id)
         emit('conversation_initialized', {'conversation_id': conversation_id})
 
 @socketio.on('send_message')
@@ -1837,6 +2313,8 @@ def handle_message(data):
         message = data.get('message', '')
         conversation_id = data.get('conversation_id')
         client_name = data.get('client_name', 'Anonymous')
+        # Streaming clients receive message_chunk events before the final message_response
+        stream = bool(data.get('stream', False))
         
         if not message or not conversation_id:
             emit('error', {'message': 'Missing message or conversation_id'})
@@ -1844,18 +2322,8 @@ def handle_message(data):
         
         print(f"💬 WebSocket message from {client_name}: {message[:50]}...")
         
-        # Add user message to conversation history
-        user_message = {
-            'role': 'user',
-            'content': message,
-            'timestamp': datetime.now().isoformat(),
-            'client_name': client_name
-        }
-        
-        if conversation_id not in conversation_history:
-            conversation_history[conversation_id] = []
-        
-        conversation_history[conversation_id].append(user_message)
+        # Add user message to the conversation log
+        memory_manager.add_message(conversation_id, "user", message, client_name=client_name)
         
         # Check for report restructuring requests
         restructure_keywords = ['restructure report', 'reorganize report', 'change report', 'modify report', 'customize report', 'focus on', 'prioritize', 'emphasize']
@@ -1877,15 +2345,15 @@ I've noted your request to restructure the report. When you click the **"📊 Ge
 
 Your restructuring preference has been saved for this conversation. Click the Generate Report button when you're ready to create your customized report!"""
         else:
-            # Get conversation history for context using LangChain
-            history = memory_manager.get_conversation_history(conversation_id)
+            # Last 6 messages for context, not counting the message being answered
+            history = memory_manager.get_conversation_history(conversation_id, limit=7)[:-1]
             
             # Build context from recent conversation
             context = ""
             if history:
                 context = "\n".join([
-                    f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
-                    for msg in history[-6:]  # Last 6 messages for context
+                    f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+                    for msg in history
                 ])
             
             # Generate AI response with conversation context
@@ -1907,19 +2375,26 @@ Your restructuring preference has been saved for this conversation. Click the Ge
             else:
                 full_prompt = f"{system_prompt}\n\nUser message: {message}"
             
-            response = get_gemini_response(full_prompt)
-        
-        # Add assistant response to conversation history
-        assistant_message = {
-            'role': 'assistant',
-            'content': response,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        conversation_history[conversation_id].append(assistant_message)
+            if stream:
+                response = ""
+                try:
+                    for chunk_index, delta in enumerate(stream_gemini_response(full_prompt)):
+                        response += delta
+                        emit('message_chunk', {
+                            'delta': delta,
+                            'content': response,
+                            'index': chunk_index,
+                            'conversation_id': conversation_id
+                        }, room=conversation_id)
+                        # Yield to the async server so each chunk is flushed immediately
+                        socketio.sleep(0)
+                except Exception as e:
+                    print(f"Error streaming from Gemini: {e}")
+                    response += f"\n\nI encountered an error processing your request: {str(e)}"
+            else:
+                response = get_gemini_response(full_prompt)
         
-        # Add to LangChain memory for persistent storage and semantic search
-        memory_manager.add_message(conversation_id, "user", message)
+        # Add assistant response to the conversation log (also summarized and indexed for search)
         memory_manager.add_message(conversation_id, "assistant", response)
         
         # Emit response to the conversation room
@@ -1958,33 +2433,8 @@ def handle_generate_report(data):
             'conversation_id': conversation_id
         }, room=conversation_id)
         
-        # Get user preference for this conversation
-        user_preference = conversation_preferences.get(conversation_id, "")
-        
-        # Detect which template to use based on user preference
-        template_name = detect_report_template(user_preference)
-        print(f"📋 Using template: {template_name} for conversation {conversation_id}")
-        
-        # Generate financial data based on conversation history
-        financial_data = generate_financial_data_from_conversation(conversation_id, client_name)
-        
-        # Generate customized report prompt using template system
-        report_prompt = generate_custom_report_prompt(client_name, template_name, user_preference, conversation_id)
-        
-        # Generate report content
-        report_content = get_gemini_response(report_prompt)
-        
-        # Create report ID and store it
-        report_id = str(uuid.uuid4())
-        reports[report_id] = {
-            "id": report_id,
-            "client_name": client_name,
-            "content": report_content,
-            "financial_data": financial_data,
-            "created_at": datetime.now().isoformat(),
-            "conversation_id": conversation_id,
-            "user_preference": user_preference
-        }
+        # Run the report pipeline (shared with concurrent identical requests)
+        report_id = create_report(client_name, conversation_id)["id"]
         
         # Generate URL for accessing the report
         report_url = f"http://localhost:8000/reports/{report_id}"
@@ -2006,7 +2456,7 @@ def handle_generate_report(data):
             'type': 'report_generation'
         }
         
-        conversation_history[conversation_id].append(report_message)
+        conversation_history.append(conversation_id, report_message)
         
         # Emit updated conversation history
         emit('conversation_updated', {
@@ -2020,7 +2470,7 @@ def handle_generate_report(data):
 
 if __name__ == '__main__':
     print("🚀 Starting Financial Assistant API with WebSocket support...")
-    print(f"🔑 API Key Status: {'✅ Configured' if gemini_model else '❌ Not configured'}")
+    print(f"🔑 API Key Status: {'✅ Configured' if llm_backend else '❌ Not configured'}")
     print("🌐 Server starting on http://localhost:8000")
     print("🔌 WebSocket support enabled")
     socketio.run(app, host='0.0.0.0', port=8000, debug=True)
@@ -0,0 +1,47 @@
+from conversation_store import ConversationStore, ConversationHistory
+
+def message(role, content, **extra):
+    return {"role": role, "content": content, **extra}
+
+def test_append_returns_the_message_index(tmp_path):
+    history = ConversationHistory(ConversationStore(str(tmp_path / "conversations.db")))
+    for expected, role in enumerate(["user", "assistant", "user"]):
+        log, index = history.append("c1", message(role, f"m{expected}"))
+        assert index == expected
+        assert log.content(index) == f"m{expected}"
+
+def test_index_accounts_for_rows_from_other_workers(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    worker, other_worker = ConversationHistory(store), ConversationHistory(store)
+    worker.append("c1", message("user", "hello"))
+    other_worker.append("c1", message("system", "joined"))
+    log, index = worker.append("c1", message("assistant", "hi"))
+    assert index == 2
+    assert log.slice(0) == worker.tail("c1")
+
+def test_reply_pairs_with_its_user_message_across_interleaved_appends(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    history, other_worker = ConversationHistory(store), ConversationHistory(store)
+    history.append("c1", message("user", "What about my RRSP?"))
+    history.append("c1", message("assistant", "Report generated", type="report_generation"))
+    other_worker.append("c1", message("system", "Advisor joined"))
+    log, reply_index = history.append("c1", message("assistant", "Your RRSP looks on track."))
+
+    user_index = history.take_pending_turn("c1")
+    assert log.content(user_index) == "What about my RRSP?"
+    assert reply_index == 3
+    # Each user message is paired at most once
+    assert history.take_pending_turn("c1") is None
+
+def test_latest_user_message_is_the_pending_turn(tmp_path):
+    history = ConversationHistory(ConversationStore(str(tmp_path / "conversations.db")))
+    history.append("c1", message("user", "first"))
+    log, _ = history.append("c1", message("user", "second"))
+    assert log.content(history.take_pending_turn("c1")) == "second"
+
+def test_delete_drops_the_pending_turn(tmp_path):
+    history = ConversationHistory(ConversationStore(str(tmp_path / "conversations.db")))
+    history.append("c1", message("user", "hello"))
+    history.delete("c1")
+    assert history.take_pending_turn("c1") is None
+    assert "c1" not in history
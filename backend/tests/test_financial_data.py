@@ -0,0 +1,79 @@
+import pytest
+
+from financial_data import extract_financial_mentions, merge_financial_info, empty_financial_info
+
+def user(content):
+    return {"role": "user", "content": content}
+
+def assistant(content):
+    return {"role": "assistant", "content": content}
+
+@pytest.mark.parametrize("content, section, field, value", [
+    ("I have $45k in my TFSA", "assets", "tfsa", 45000),
+    ("My mortgage is 320,000", "liabilities", "mortgage", 320000),
+    ("There's about 12,500 on my credit cards", "liabilities", "creditCards", 12500),
+    ("My RRSP has $80,000 in it", "assets", "rrsp", 80000),
+])
+def test_plain_balances_are_read_without_the_model(content, section, field, value):
+    update, confident = extract_financial_mentions([user(content)])
+    assert confident
+    assert update[section] == {field: value}
+
+@pytest.mark.parametrize("content", [
+    # A debt phrased against an asset is not the asset's value
+    "I owe 320,000 on my house",
+    "We still have 250k left on the house",
+    # Changes are not balances
+    "My investments are down 20k this year",
+    "My portfolio gained $15,000 last quarter",
+    "I lost 10k in stocks",
+])
+def test_debts_and_changes_go_to_the_model(content):
+    _, confident = extract_financial_mentions([user(content)])
+    assert not confident
+
+@pytest.mark.parametrize("content", [
+    "I am hoping to buy a house in 5 years",
+    "My short-term priority is building an emergency fund",
+    "I want to retire at 60",
+])
+def test_goal_only_messages_go_to_the_model(content):
+    update, confident = extract_financial_mentions([user(content)])
+    assert not confident
+    assert update["goals"] == {}
+
+def test_goal_alongside_a_balance_goes_to_the_model():
+    _, confident = extract_financial_mentions([user("I have $45k in my TFSA and I'm saving for a house")])
+    assert not confident
+
+@pytest.mark.parametrize("content", [
+    "Thanks, that makes sense",
+    "I earn 90k a year",
+])
+def test_message_without_a_placed_amount_goes_to_the_model(content):
+    _, confident = extract_financial_mentions([user(content)])
+    assert not confident
+
+def test_every_user_message_must_be_read():
+    messages = [user("I have $45k in my TFSA"), assistant("Great."), user("I'm also hoping to buy a cottage")]
+    _, confident = extract_financial_mentions(messages)
+    assert not confident
+
+def test_advisor_figures_are_ignored():
+    messages = [assistant("For example, $100k in an RRSP could grow."), user("My RRSP is $30,000")]
+    update, confident = extract_financial_mentions(messages)
+    assert confident
+    assert update["assets"] == {"rrsp": 30000}
+
+def test_later_restatement_supersedes_earlier():
+    messages = [user("My TFSA is $20k"), user("My TFSA has $25,000 now")]
+    update, confident = extract_financial_mentions(messages)
+    assert confident
+    assert update["assets"]["tfsa"] == 25000
+
+def test_merge_keeps_unmentioned_fields_and_recomputes_totals():
+    snapshot = merge_financial_info(empty_financial_info(), {"assets": {"rrsp": 50000}, "liabilities": {"mortgage": 200000}})
+    merged = merge_financial_info(snapshot, {"assets": {"tfsa": 10000, "rrsp": None}})
+    assert merged["assets"]["rrsp"] == 50000
+    assert merged["assets"]["totalAssets"] == 60000
+    assert merged["netWorth"] == 60000 - 200000
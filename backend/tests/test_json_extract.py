@@ -0,0 +1,60 @@
+import pytest
+
+from json_extract import (
+    IncrementalJSONParser, JSONExtractionError, NUMBER, extract_json, extract_json_from_stream
+)
+
+SCHEMA = {"assets": {"rrsp": NUMBER, "tfsa": NUMBER}, "netWorth": NUMBER}
+
+OUTPUT = 'Here you go:\n```json\n{"assets": {"rrsp": 45000, "tfsa": "20,000"}, "netWorth": 65000, "note": "a } in a string"}\n```\nDone.'
+
+def chunks_of(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(OUTPUT)])
+def test_object_split_across_chunks_is_found(size):
+    parser = IncrementalJSONParser(SCHEMA)
+    results = [parser.feed(chunk) for chunk in chunks_of(OUTPUT, size)]
+    found = [result for result in results if result is not None]
+    assert found[0]["assets"] == {"rrsp": 45000, "tfsa": "20,000"}
+    assert found[0]["note"] == "a } in a string"
+    assert parser.close() == found[0]
+
+def test_feed_returns_none_until_the_object_closes():
+    parser = IncrementalJSONParser(SCHEMA)
+    assert parser.feed('{"assets": {"rrsp": 1') is None
+    assert parser.feed('}, "netWorth": 1') is None
+    assert parser.feed('}') == {"assets": {"rrsp": 1}, "netWorth": 1}
+
+def test_escaped_quotes_split_between_chunks():
+    parser = IncrementalJSONParser({"text": str})
+    for chunk in ['{"text": "say \\', '"}\\', '" ok"}']:
+        parser.feed(chunk)
+    assert parser.close() == {"text": 'say "}" ok'}
+
+def test_prose_braces_and_wrong_shapes_are_skipped():
+    text = 'Fill in {name}. Example: {"unrelated": 1} then {"netWorth": 5}'
+    assert extract_json(text, SCHEMA) == {"netWorth": 5}
+
+def test_unbalanced_brace_in_leading_prose_is_retried_on_close():
+    parser = IncrementalJSONParser(SCHEMA)
+    for chunk in chunks_of('Note: { unclosed. {"netWorth": 7}', 4):
+        parser.feed(chunk)
+    assert parser.close() == {"netWorth": 7}
+
+def test_incomplete_output_raises_on_close():
+    parser = IncrementalJSONParser(SCHEMA)
+    parser.feed('{"netWorth": 7')
+    with pytest.raises(JSONExtractionError):
+        parser.close()
+
+def test_stream_stops_reading_once_the_object_closes():
+    consumed = []
+
+    def chunks():
+        for chunk in ['{"netWorth"', ': 3}', ' trailing', ' prose']:
+            consumed.append(chunk)
+            yield chunk
+
+    assert extract_json_from_stream(chunks(), SCHEMA) == {"netWorth": 3}
+    assert consumed == ['{"netWorth"', ': 3}']
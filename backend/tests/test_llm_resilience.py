@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_backends import StubLLMBackend
+from llm_resilience import ResilientLLMCaller, LLMDeadlineExceeded, CircuitBreaker
+from llm_scheduler import LLMScheduler
+
+PROMPT = "How should I split savings between my RRSP and TFSA?"
+
+def stub(latency_ms):
+    return StubLLMBackend(latency_ms=latency_ms, latency_distribution="fixed", tokens_per_second=0)
+
+def caller(deadline=1.0, **kwargs):
+    kwargs.setdefault("base_delay", 0.01)
+    return ResilientLLMCaller({"chat": deadline}, **kwargs)
+
+class Flaky:
+    """Raises the given errors on the first calls, then defers to the backend"""
+
+    def __init__(self, backend, *errors):
+        self.backend = backend
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.backend.generate(prompt)
+
+def test_call_returns_the_backend_response():
+    backend = stub(5)
+    llm = caller()
+    assert llm.call("chat", backend.generate, PROMPT) == backend.generate(PROMPT)
+    assert llm.stats()["lanes"]["chat"]["samples"] == 1
+
+def test_call_fails_at_its_deadline():
+    llm = caller(deadline=0.1, max_attempts=1)
+    started = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        llm.call("chat", stub(500).generate, PROMPT)
+    assert time.monotonic() - started < 0.4
+    assert llm.counters["deadline_exceeded"] == 1
+
+def test_transient_errors_are_retried():
+    flaky = Flaky(stub(5), ConnectionError("reset"), TimeoutError("slow"))
+    llm = caller()
+    assert llm.call("chat", flaky.generate, PROMPT)
+    assert flaky.calls == 3
+    assert llm.counters["retries"] == 2
+
+def test_non_transient_errors_are_not_retried():
+    flaky = Flaky(stub(5), ValueError("bad request"))
+    llm = caller()
+    with pytest.raises(ValueError):
+        llm.call("chat", flaky.generate, PROMPT)
+    assert flaky.calls == 1
+
+def test_retries_stop_at_max_attempts():
+    flaky = Flaky(stub(5), *[ConnectionError("reset")] * 5)
+    with pytest.raises(ConnectionError):
+        caller(max_attempts=2).call("chat", flaky.generate, PROMPT)
+    assert flaky.calls == 2
+
+def test_slow_primary_is_hedged():
+    slow, fast = stub(500), stub(5)
+    calls = []
+
+    def generate(prompt):
+        calls.append(prompt)
+        return (slow if len(calls) == 1 else fast).generate(prompt)
+
+    llm = caller(hedge_lanes=("chat",), hedge_after=0.05)
+    started = time.monotonic()
+    assert llm.call("chat", generate, PROMPT) == fast.generate(PROMPT)
+    assert time.monotonic() - started < 0.4
+    assert llm.counters["hedges"] == 1
+    assert llm.counters["hedge_wins"] == 1
+
+def test_slot_wait_counts_against_the_deadline():
+    scheduler = LLMScheduler(max_concurrency=1)
+    llm = caller(deadline=0.1, scheduler=scheduler)
+    with scheduler.slot("chat"):
+        with pytest.raises(LLMDeadlineExceeded):
+            llm.call("chat", stub(5).generate, PROMPT)
+    assert llm.counters["queue_timeouts"] == 1
+
+def test_abandoned_attempt_keeps_its_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+    llm = caller(deadline=0.1, max_attempts=1, scheduler=scheduler)
+    with pytest.raises(LLMDeadlineExceeded):
+        llm.call("chat", stub(300).generate, PROMPT)
+    assert llm.stats()["abandoned_running"] == 1
+    assert scheduler.stats()["active"] == 1
+    time.sleep(0.3)
+    assert llm.stats()["abandoned_running"] == 0
+    assert scheduler.stats()["active"] == 0
+
+def test_stream_yields_the_whole_response():
+    backend = StubLLMBackend(latency_ms=5, latency_distribution="fixed", tokens_per_second=1000)
+    deltas = list(caller().stream("chat", backend.stream, PROMPT))
+    assert len(deltas) > 1
+    assert "".join(deltas) == backend.generate(PROMPT)
+
+def test_stream_fails_when_the_first_delta_is_late():
+    llm = ResilientLLMCaller({"chat": 1.0}, max_attempts=1, first_delta_deadlines={"chat": 0.1})
+    started = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        list(llm.stream("chat", stub(500).stream, PROMPT))
+    assert time.monotonic() - started < 0.4
+
+def test_stream_fails_when_deltas_stall():
+    def stalling(prompt):
+        yield "first "
+        time.sleep(0.5)
+        yield "second"
+
+    llm = caller(chunk_deadline=0.1)
+    received = []
+    with pytest.raises(LLMDeadlineExceeded):
+        for delta in llm.stream("chat", stalling, PROMPT):
+            received.append(delta)
+    assert received == ["first "]
+
+def test_async_call_deadline_and_success():
+    async def scenario():
+        llm = caller(deadline=0.1, max_attempts=1)
+        text = await llm.call_async("chat", stub(5).generate_async, PROMPT)
+        with pytest.raises(LLMDeadlineExceeded):
+            await llm.call_async("chat", stub(500).generate_async, PROMPT)
+        return text
+
+    assert asyncio.run(scenario()) == stub(5).generate(PROMPT)
+
+def test_async_stream_yields_the_whole_response():
+    backend = StubLLMBackend(latency_ms=5, latency_distribution="fixed", tokens_per_second=1000)
+
+    async def scenario():
+        return [delta async for delta in caller().stream_async("chat", backend.stream_async, PROMPT)]
+
+    assert "".join(asyncio.run(scenario())) == backend.generate(PROMPT)
+
+def test_only_outages_open_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=60)
+    llm = caller(max_attempts=1, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            llm.call("chat", Flaky(stub(5), ValueError("safety block")).generate, PROMPT)
+    assert breaker.state == CircuitBreaker.CLOSED
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            llm.call("chat", Flaky(stub(5), ConnectionError("reset")).generate, PROMPT)
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_hung_probe_counts_as_a_failed_probe():
+    calls = []
+
+    def probe():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(0.5)
+
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01, probe=probe, probe_timeout_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # The hung first probe times out; once it has returned, a later probe closes the breaker
+    give_up_at = time.monotonic() + 2
+    while breaker.state == CircuitBreaker.OPEN and time.monotonic() < give_up_at:
+        time.sleep(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert len(calls) == 2
+    assert breaker.counters["probes"] > 2
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, AsyncLLMScheduler
+
+def wait_until(condition, timeout=2.0):
+    give_up_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < give_up_at, "condition not reached"
+        time.sleep(0.005)
+
+def test_waiting_lanes_are_served_by_priority():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    def take(lane):
+        with scheduler.slot(lane):
+            order.append(lane)
+
+    threads = []
+    with scheduler.slot("chat"):
+        for lane in ["extraction", "report", "chat"]:
+            thread = threading.Thread(target=take, args=(lane,))
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda: scheduler.stats()["waiting"] == len(threads))
+    for thread in threads:
+        thread.join()
+
+    assert order == ["chat", "report", "extraction"]
+
+def test_concurrency_cap_is_never_exceeded():
+    scheduler = LLMScheduler(max_concurrency=2)
+    lock = threading.Lock()
+    active = peak = 0
+
+    def work(lane):
+        nonlocal active, peak
+        with scheduler.slot(lane):
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+    threads = [threading.Thread(target=work, args=(lane,)) for lane in ["chat", "report", "extraction"] * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == 2
+    stats = scheduler.stats()
+    assert stats["active"] == 0
+    assert sum(lane["started"] for lane in stats["lanes"].values()) == 9
+
+def test_slot_wait_times_out_and_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1)
+    with scheduler.slot("chat"):
+        with pytest.raises(TimeoutError):
+            with scheduler.slot("report", timeout=0.05):
+                pass
+        assert scheduler.stats()["waiting"] == 0
+    # The abandoned ticket does not block the next caller
+    with scheduler.slot("extraction", timeout=0.05):
+        pass
+    assert scheduler.stats()["lanes"]["report"]["timed_out"] == 1
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        with LLMScheduler().slot("batch"):
+            pass
+
+def test_async_waiting_lanes_are_served_by_priority():
+    async def scenario():
+        scheduler = AsyncLLMScheduler(max_concurrency=1)
+        order = []
+
+        async def take(lane):
+            async with scheduler.slot(lane):
+                order.append(lane)
+
+        tasks = []
+        async with scheduler.slot("chat"):
+            for lane in ["extraction", "report", "chat"]:
+                tasks.append(asyncio.ensure_future(take(lane)))
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["chat", "report", "extraction"]
+
+def test_async_concurrency_cap_and_timeout():
+    async def scenario():
+        scheduler = AsyncLLMScheduler(max_concurrency=2)
+        active = peak = 0
+
+        async def work():
+            nonlocal active, peak
+            async with scheduler.slot("report"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+
+        await asyncio.gather(*(work() for _ in range(6)))
+
+        async with scheduler.slot("chat"), scheduler.slot("chat"):
+            with pytest.raises(TimeoutError):
+                async with scheduler.slot("extraction", timeout=0.02):
+                    pass
+        # The timed-out waiter left no slot behind
+        async with scheduler.slot("chat"), scheduler.slot("chat"):
+            pass
+        return peak, scheduler.stats()
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats["active"] == 0
+    assert stats["lanes"]["extraction"]["timed_out"] == 1
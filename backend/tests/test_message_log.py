@@ -0,0 +1,47 @@
+from message_log import MessageLog
+
+def make_log(count):
+    log = MessageLog()
+    for i in range(count):
+        log.append({"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"})
+    return log
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+def test_messages_limit_keeps_the_newest_in_order():
+    log = make_log(5)
+    assert contents(log.messages(limit=2)) == ["message 3", "message 4"]
+    assert contents(log.messages(limit=10)) == contents(log.messages())
+
+def test_messages_without_a_limit_returns_everything():
+    log = make_log(3)
+    assert len(log.messages()) == 3
+    assert len(log.messages(limit=None)) == 3
+    assert len(log.messages(limit=0)) == 3
+
+def test_slice_uses_absolute_positions():
+    log = make_log(6)
+    assert contents(log.slice(2, 4)) == ["message 2", "message 3"]
+    assert contents(log.slice(4)) == ["message 4", "message 5"]
+
+def test_slice_clamps_out_of_range_bounds():
+    log = make_log(3)
+    assert contents(log.slice(-5, 1)) == ["message 0"]
+    assert contents(log.slice(1, 100)) == ["message 1", "message 2"]
+    assert log.slice(3) == []
+
+def test_slice_is_unaffected_by_later_appends():
+    log = make_log(2)
+    stop = len(log)
+    log.append({"role": "user", "content": "message 2"})
+    assert contents(log.slice(0, stop)) == ["message 0", "message 1"]
+
+def test_extra_fields_and_unicode_round_trip():
+    log = MessageLog()
+    log.append({"role": "assistant", "content": "Épargne 💰", "type": "report", "client_name": "Ana"})
+    message = log.message(0)
+    assert message["content"] == "Épargne 💰"
+    assert message["type"] == "report"
+    assert message["client_name"] == "Ana"
+    assert log.role(0) == "assistant"
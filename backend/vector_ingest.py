@@ -0,0 +1,149 @@
+"""
+Vector Ingestion Queue
+Background, batched ingestion of conversation turns into the vector store.
+Chunks are queued on the request path and embedded/written in bulk off it,
+flushing when a batch fills or the oldest queued chunk gets too old.
+"""
+
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+class VectorIngestQueue:
+    def __init__(self, vectorstore, max_batch=64, max_delay_seconds=2.0, max_queued=10000):
+        self.vectorstore = vectorstore
+        self.max_batch = max_batch
+        self.max_delay_seconds = max_delay_seconds
+        self.max_queued = max_queued
+
+        # (text, metadata) pairs waiting to be embedded, across all conversations
+        self._queue = []
+        self._oldest_queued_at = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+
+        self.enqueued = 0
+        self.ingested = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_seconds = 0.0
+
+        self._worker = threading.Thread(target=self._run, name="vector-ingest", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def enqueue(self, chunks, metadata):
+        """Queue chunks sharing one metadata dict for ingestion; never blocks on the embedding API"""
+        with self._condition:
+            if self._closed:
+                return
+            room = self.max_queued - len(self._queue)
+            if room < len(chunks):
+                # Search is best-effort: shed the newest chunks rather than grow without bound
+                self.dropped += len(chunks) - max(room, 0)
+                chunks = chunks[:max(room, 0)]
+            if not chunks:
+                return
+            if not self._queue:
+                self._oldest_queued_at = time.monotonic()
+            self._queue.extend((chunk, dict(metadata)) for chunk in chunks)
+            self.enqueued += len(chunks)
+            if len(self._queue) >= self.max_batch:
+                self._condition.notify()
+
+    def _take_batch(self):
+        """Wait until a batch is full or old enough, then take it (caller holds the condition)"""
+        while not self._closed:
+            if len(self._queue) >= self.max_batch:
+                break
+            if self._queue:
+                remaining = self.max_delay_seconds - (time.monotonic() - self._oldest_queued_at)
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            else:
+                self._condition.wait()
+
+        batch = self._queue[:self.max_batch]
+        del self._queue[:self.max_batch]
+        self._oldest_queued_at = time.monotonic() if self._queue else None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._closed and not self._queue:
+                    return
+                batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        """One bulk embedding + add_texts call for the whole batch"""
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                self.vectorstore.add_texts(
+                    texts=[text for text, _ in batch],
+                    metadatas=[metadata for _, metadata in batch]
+                )
+                self.ingested += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"⚠️ Error adding batch of {len(batch)} chunks to vector store: {e}")
+            self.batches += 1
+            self.last_flush_seconds = time.perf_counter() - started
+
+    def flush(self):
+        """Synchronously write everything queued so far"""
+        while True:
+            with self._condition:
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+                self._oldest_queued_at = time.monotonic() if self._queue else None
+            if not batch:
+                return
+            self._write(batch)
+
+    @contextmanager
+    def paused(self):
+        """Hold off batch writes (chunks keep queueing) while the collection is being maintained"""
+        with self._flush_lock:
+            yield
+
+    def close(self, timeout=30):
+        """Stop accepting turns and drain the queue"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queued": len(self._queue),
+                "enqueued": self.enqueued,
+                "ingested": self.ingested,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "last_flush_seconds": round(self.last_flush_seconds, 4),
+                "max_batch": self.max_batch,
+                "max_delay_seconds": self.max_delay_seconds
+            }
+
+def create_vector_ingest_queue(vectorstore):
+    """Ingestion queue configured from VECTOR_INGEST_* environment variables"""
+    return VectorIngestQueue(
+        vectorstore,
+        max_batch=int(os.getenv('VECTOR_INGEST_BATCH_SIZE', '64')),
+        max_delay_seconds=float(os.getenv('VECTOR_INGEST_MAX_DELAY_SECONDS', '2.0')),
+        max_queued=int(os.getenv('VECTOR_INGEST_MAX_QUEUED', '10000'))
+    )
@@ -0,0 +1,146 @@
+"""
+Vector Store Maintenance
+Retention, de-duplication and compaction for the Chroma conversation collection,
+with size and query-latency measurements before and after each run.
+"""
+
+import os
+import time
+import sqlite3
+from datetime import datetime, timedelta
+
+DEFAULT_PROBE_QUERIES = ["retirement savings", "mortgage payments", "RRSP contribution", "credit card debt"]
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+def measure(vectorstore, embeddings, persist_directory, probe_queries, k=5):
+    """Size on disk, vector count and probe query latency (embedding excluded)"""
+    report = {
+        "bytes_on_disk": directory_size(persist_directory),
+        "vectors": vectorstore.count()
+    }
+    latencies = []
+    for query in probe_queries:
+        vector = embeddings.embed_query(query)
+        started = time.perf_counter()
+        vectorstore.similarity_search_by_vector(vector, k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    report["query_ms_mean"] = round(sum(latencies) / len(latencies), 3) if latencies else 0.0
+    report["query_ms_p95"] = round(_percentile(latencies, 0.95), 3)
+    return report
+
+def _iter_records(vectorstore, page_size):
+    offset = 0
+    while True:
+        page = vectorstore.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            return
+        yield from zip(ids, page.get("documents") or [], page.get("metadatas") or [])
+        offset += len(ids)
+
+def _expired(metadata, cutoff):
+    timestamp = (metadata or {}).get("timestamp")
+    if not timestamp or cutoff is None:
+        return False
+    try:
+        return datetime.fromisoformat(timestamp) < cutoff
+    except ValueError:
+        return False
+
+def compact_collection(vectorstore, embeddings, persist_directory, retention_days=0,
+                       conversation_exists=None, probe_queries=None, page_size=1000, vacuum=True):
+    """
+    Delete chunks older than retention_days (0 keeps everything), chunks whose conversation no
+    longer exists or was deleted (tombstoned), and duplicate chunks within a conversation (the
+    oldest copy is kept); then vacuum Chroma's SQLite file. Returns a report including the deleted
+    (conversation_id, text) pairs.
+    """
+    probe_queries = probe_queries or DEFAULT_PROBE_QUERIES
+    before = measure(vectorstore, embeddings, persist_directory, probe_queries)
+    # Taken before the scan, so a conversation deleted mid-scan stays tombstoned until the next run
+    tombstones = vectorstore.tombstones() if hasattr(vectorstore, "tombstones") else {}
+
+    cutoff = datetime.now() - timedelta(days=retention_days) if retention_days > 0 else None
+    existing = {}
+    seen = {}
+    expired, orphaned, duplicates = [], [], []
+
+    started = time.perf_counter()
+    for record_id, text, metadata in _iter_records(vectorstore, page_size):
+        metadata = metadata or {}
+        conversation_id = metadata.get("conversation_id")
+        if _expired(metadata, cutoff):
+            expired.append((record_id, conversation_id, text))
+            continue
+        if tombstones and vectorstore.is_deleted(metadata):
+            orphaned.append((record_id, conversation_id, text))
+            continue
+        if conversation_exists is not None and conversation_id:
+            if conversation_id not in existing:
+                existing[conversation_id] = conversation_exists(conversation_id)
+            if not existing[conversation_id]:
+                orphaned.append((record_id, conversation_id, text))
+                continue
+
+        key = (conversation_id, text)
+        previous = seen.get(key)
+        if previous is None:
+            seen[key] = (record_id, metadata.get("timestamp") or "")
+            continue
+        # Keep the oldest copy so the chunk's original timestamp drives retention
+        if (metadata.get("timestamp") or "") < previous[1]:
+            duplicates.append((previous[0], conversation_id, text))
+            seen[key] = (record_id, metadata.get("timestamp") or "")
+        else:
+            duplicates.append((record_id, conversation_id, text))
+
+    doomed = expired + orphaned + duplicates
+    for start in range(0, len(doomed), page_size):
+        vectorstore.delete(ids=[record_id for record_id, _, _ in doomed[start:start + page_size]])
+    if tombstones:
+        vectorstore.clear_tombstones(tombstones)
+    scan_seconds = time.perf_counter() - started
+
+    vacuumed = False
+    if vacuum:
+        vacuumed = vacuum_sqlite(os.path.join(persist_directory, "chroma.sqlite3"))
+
+    after = measure(vectorstore, embeddings, persist_directory, probe_queries)
+    return {
+        "before": before,
+        "after": after,
+        "deleted": {"expired": len(expired), "orphaned": len(orphaned), "duplicates": len(duplicates)},
+        # Duplicates leave a surviving copy, so only expired and orphaned chunks leave the keyword index
+        "removed_chunks": [(conversation_id, text) for _, conversation_id, text in expired + orphaned],
+        "retention_days": retention_days,
+        "vacuumed": vacuumed,
+        "scan_seconds": round(scan_seconds, 3)
+    }
+
+def vacuum_sqlite(db_path):
+    """Rebuild a SQLite file to release pages freed by deletions; returns whether it ran"""
+    if not os.path.exists(db_path):
+        return False
+    try:
+        connection = sqlite3.connect(db_path, timeout=30)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+        return True
+    except Exception as e:
+        print(f"⚠️ Error vacuuming {db_path}: {e}")
+        return False
@@ -0,0 +1,303 @@
+"""
+Partitioned Vector Store
+One Chroma collection per conversation plus a global collection for cross-conversation
+search. Conversation-scoped queries touch only that conversation's vectors instead of
+filtering the whole corpus, and deleting a conversation drops its collection outright.
+Its global chunks are tombstoned rather than deleted by a scan of the global collection:
+hidden from search at once and purged by the next maintenance pass.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import chromadb
+from langchain_community.vectorstores import Chroma
+
+class PartitionedVectorStore:
+    def __init__(self, embeddings, persist_directory, global_collection_name,
+                 partition_prefix="conversation", max_open_partitions=256):
+        self.embeddings = embeddings
+        self.persist_directory = persist_directory
+        self.partition_prefix = partition_prefix
+        self.max_open_partitions = max_open_partitions
+
+        self._client = chromadb.PersistentClient(path=persist_directory)
+        self.global_store = Chroma(
+            collection_name=global_collection_name,
+            embedding_function=embeddings,
+            client=self._client
+        )
+        self._global = self._collection(global_collection_name)
+
+        # conversation_id -> (Chroma handle, collection), least recently used first
+        self._open = OrderedDict()
+        self._lock = threading.RLock()
+        self._partitions = {
+            getattr(collection, "name", collection) for collection in self._client.list_collections()
+        }
+        # conversation_id -> when it was deleted; its global chunks from before then are hidden until purged
+        self._tombstones = self._load_tombstones()
+        self.skipped_duplicates = 0
+
+    def _collection(self, name):
+        # Vectors are always computed here and passed in, so the collection needs no embedding function
+        return self._client.get_or_create_collection(name=name, embedding_function=None)
+
+    def partition_name(self, conversation_id):
+        digest = hashlib.sha256(conversation_id.encode('utf-8')).hexdigest()[:32]
+        return f"{self.partition_prefix}_{digest}"
+
+    def _partition(self, conversation_id, create=False):
+        """
+        (Chroma handle, collection) for a conversation's partition, or None if it does not exist
+        and create is False
+        """
+        with self._lock:
+            partition = self._open.get(conversation_id)
+            if partition is not None:
+                self._open.move_to_end(conversation_id)
+                return partition
+
+            name = self.partition_name(conversation_id)
+            if name not in self._partitions and not create:
+                return None
+            store = Chroma(
+                collection_name=name,
+                embedding_function=self.embeddings,
+                client=self._client
+            )
+            partition = (store, self._collection(name))
+            self._partitions.add(name)
+            self._open[conversation_id] = partition
+            while len(self._open) > self.max_open_partitions:
+                self._open.popitem(last=False)
+            return partition
+
+    def _tombstones_path(self):
+        return os.path.join(self.persist_directory, f".{self.partition_prefix}_deleted_conversations.json")
+
+    def _load_tombstones(self):
+        try:
+            with open(self._tombstones_path(), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error reading deleted conversation tombstones: {e}")
+            return {}
+
+    def _save_tombstones(self):
+        path = self._tombstones_path()
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self._tombstones, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"⚠️ Error saving deleted conversation tombstones: {e}")
+
+    def is_deleted(self, metadata):
+        """
+        Whether a chunk belongs to a deleted conversation and was written before the deletion;
+        a conversation re-created under the same id keeps its new chunks
+        """
+        metadata = metadata or {}
+        deleted_at = self._tombstones.get(metadata.get("conversation_id"))
+        return deleted_at is not None and (metadata.get("timestamp") or "") <= deleted_at
+
+    def tombstones(self):
+        """conversation_id -> deletion time for conversations whose global chunks await purging"""
+        with self._lock:
+            return dict(self._tombstones)
+
+    def clear_tombstones(self, tombstones):
+        """Forget tombstones whose chunks maintenance has purged, unless the conversation was deleted again since"""
+        with self._lock:
+            for conversation_id, deleted_at in tombstones.items():
+                if self._tombstones.get(conversation_id) == deleted_at:
+                    del self._tombstones[conversation_id]
+            self._save_tombstones()
+
+    @staticmethod
+    def chunk_id(conversation_id, text):
+        """Content-derived id, so a chunk already stored for its conversation is recognized before embedding"""
+        return hashlib.sha256(f"{conversation_id or ''}\x00{text}".encode('utf-8')).hexdigest()
+
+    def add_texts(self, texts, metadatas):
+        """
+        Embed once, then write each chunk to the global collection and to its conversation's partition.
+        Chunks already stored for their conversation (a repeated greeting and canned reply) are skipped
+        without embedding; the stored copy keeps its original timestamp. Returns the ids of the chunks
+        kept, which excludes chunks of conversations deleted after they were written.
+        """
+        if self._tombstones:
+            # Chunks still queued when their conversation was deleted must not recreate its partition
+            kept = [index for index, metadata in enumerate(metadatas) if not self.is_deleted(metadata)]
+            texts = [texts[i] for i in kept]
+            metadatas = [metadatas[i] for i in kept]
+        if not texts:
+            return []
+        ids = [self.chunk_id((metadata or {}).get("conversation_id"), text) for text, metadata in zip(texts, metadatas)]
+        found = self._global.get(ids=list(set(ids)), include=["metadatas"])
+        stored = {
+            record_id for record_id, metadata in zip(found.get("ids") or [], found.get("metadatas") or [])
+            # A deleted conversation's global copies are only hidden; a re-created conversation writes its own
+            if not self.is_deleted(metadata)
+        }
+        new = {}
+        for index, record_id in enumerate(ids):
+            if record_id not in stored and record_id not in new:
+                new[record_id] = index
+        self.skipped_duplicates += len(ids) - len(new)
+        if not new:
+            return ids
+
+        indexes = list(new.values())
+        new_ids = list(new.keys())
+        new_texts = [texts[i] for i in indexes]
+        new_metadatas = [metadatas[i] for i in indexes]
+        vectors = self.embeddings.embed_documents(new_texts)
+        self._global.upsert(ids=new_ids, embeddings=vectors, documents=new_texts, metadatas=new_metadatas)
+
+        groups = {}
+        for position, metadata in enumerate(new_metadatas):
+            groups.setdefault(metadata.get("conversation_id"), []).append(position)
+        for conversation_id, positions in groups.items():
+            if not conversation_id:
+                continue
+            _, collection = self._partition(conversation_id, create=True)
+            collection.upsert(
+                ids=[new_ids[i] for i in positions],
+                embeddings=[vectors[i] for i in positions],
+                documents=[new_texts[i] for i in positions],
+                metadatas=[new_metadatas[i] for i in positions]
+            )
+        return ids
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None):
+        """Scoped to one partition when filtered by conversation_id, otherwise the global collection"""
+        conversation_id = (filter or {}).get("conversation_id")
+        if conversation_id:
+            partition = self._partition(conversation_id)
+            if partition is None:
+                return []
+            remaining = {key: value for key, value in filter.items() if key != "conversation_id"}
+            return partition[0].similarity_search_with_relevance_scores(query, k=k, filter=remaining or None)
+
+        if not self._tombstones:
+            return self.global_store.similarity_search_with_relevance_scores(query, k=k, filter=filter)
+        # Over-fetch so hiding deleted conversations' chunks still leaves k results
+        results = self.global_store.similarity_search_with_relevance_scores(query, k=k * 2, filter=filter)
+        return [(doc, score) for doc, score in results if not self.is_deleted(doc.metadata)][:k]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        if not self._tombstones:
+            return self.global_store.similarity_search_by_vector(embedding, k=k)
+        docs = self.global_store.similarity_search_by_vector(embedding, k=k * 2)
+        return [doc for doc in docs if not self.is_deleted(doc.metadata)][:k]
+
+    def get(self, **kwargs):
+        """Raw global records, including tombstoned ones (maintenance purges them)"""
+        return self.global_store.get(**kwargs)
+
+    def count(self):
+        return self._global.count()
+
+    def delete(self, ids):
+        """Delete chunks by id from the global collection and from their partitions"""
+        if not ids:
+            return
+        found = self._global.get(ids=list(ids), include=["metadatas"])
+        groups = {}
+        for record_id, metadata in zip(found.get("ids") or [], found.get("metadatas") or []):
+            groups.setdefault((metadata or {}).get("conversation_id"), []).append(record_id)
+        for conversation_id, record_ids in groups.items():
+            partition = self._partition(conversation_id) if conversation_id else None
+            if partition is not None:
+                partition[1].delete(ids=record_ids)
+        self._global.delete(ids=list(ids))
+
+    def _backfill_marker(self):
+        return os.path.join(self.persist_directory, f".{self.partition_prefix}_partitions_backfilled")
+
+    def backfill_partitions(self, page_size=1000, conversation_exists=None):
+        """
+        Copy global chunks of conversations that have no partition yet (indexed before partitioning).
+        Conversations for which conversation_exists returns False are skipped. A completed run leaves a
+        marker next to the collection, since every later chunk is written to its partition directly.
+        """
+        marker = self._backfill_marker()
+        if os.path.exists(marker):
+            return 0
+        with self._lock:
+            existing = set(self._partitions)
+        known = {}
+        copied = 0
+        offset = 0
+        while True:
+            page = self._global.get(
+                include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+            )
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            groups = {}
+            for index, metadata in enumerate(page.get("metadatas") or []):
+                conversation_id = (metadata or {}).get("conversation_id")
+                if (not conversation_id or self.is_deleted(metadata)
+                        or self.partition_name(conversation_id) in existing):
+                    continue
+                if conversation_exists is not None:
+                    if conversation_id not in known:
+                        known[conversation_id] = conversation_exists(conversation_id)
+                    if not known[conversation_id]:
+                        continue
+                groups.setdefault(conversation_id, []).append(index)
+            for conversation_id, indexes in groups.items():
+                _, collection = self._partition(conversation_id, create=True)
+                collection.upsert(
+                    ids=[ids[i] for i in indexes],
+                    embeddings=[page["embeddings"][i] for i in indexes],
+                    documents=[page["documents"][i] for i in indexes],
+                    metadatas=[page["metadatas"][i] for i in indexes]
+                )
+                copied += len(indexes)
+            offset += len(ids)
+
+        try:
+            with open(marker, "w") as f:
+                f.write(f"{copied}\n")
+        except OSError as e:
+            print(f"⚠️ Error recording vector partition backfill: {e}")
+        return copied
+
+    def delete_conversation(self, conversation_id):
+        """
+        Drop a conversation's partition and tombstone its global chunks, which disappear from
+        search immediately; returns whether a partition existed
+        """
+        with self._lock:
+            self._open.pop(conversation_id, None)
+            name = self.partition_name(conversation_id)
+            existed = name in self._partitions
+            self._partitions.discard(name)
+            self._tombstones[conversation_id] = datetime.now().isoformat()
+            self._save_tombstones()
+        if existed:
+            try:
+                self._client.delete_collection(name)
+            except Exception as e:
+                print(f"⚠️ Error dropping vector partition for {conversation_id}: {e}")
+        return existed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "partitions": len(self._partitions),
+                "open_partitions": len(self._open),
+                "tombstoned_conversations": len(self._tombstones),
+                "skipped_duplicates": self.skipped_duplicates
+            }